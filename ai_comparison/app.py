@@ -1,13 +1,646 @@
 # ai_comparison.py
-from limma.llm import config, generate
 import time
 import json
+import os
+import re
+import sys
+import hashlib
+import math
+import random
+import sqlite3
+import csv
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
 import matplotlib.pyplot as plt
-from collections import defaultdict
+import numpy as np
+from collections import defaultdict, deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
 
-class AIComparisonTool:
+# Default chat endpoints, same ones limma.llm uses
+PROVIDER_ENDPOINTS = {
+    "openai": "https://api.openai.com/v1/chat/completions",
+    "groq": "https://api.groq.com/openai/v1/chat/completions",
+    "mistral": "https://api.mistral.ai/v1/chat/completions",
+    "gemini": "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+}
+
+_http = threading.local()
+
+
+def _session():
+    """One HTTP session per thread so keep-alive works without sharing state"""
+    if not hasattr(_http, "session"):
+        _http.session = requests.Session()
+    return _http.session
+
+
+def _build_request(provider_id, api_key, model, prompt, base_url=None, stream=False):
+    """Return (url, headers, payload) for one request to a provider"""
+    if provider_id == "gemini":
+        if base_url:
+            url = base_url
+            if stream:
+                url += ("&" if "?" in url else "?") + "alt=sse"
+        else:
+            url = PROVIDER_ENDPOINTS["gemini"].format(model=model)
+            if stream:
+                url = url.replace(":generateContent", ":streamGenerateContent") + "?alt=sse"
+        headers = {"x-goog-api-key": api_key, "Content-Type": "application/json"}
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    else:
+        url = base_url or PROVIDER_ENDPOINTS[provider_id]
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        payload = {"model": model, "messages": [{"role": "user", "content": prompt}]}
+        if stream:
+            payload["stream"] = True
+            
+    return url, headers, payload
+
+
+def send_prompt(provider_id, api_key, model, prompt, base_url=None, timeout=60):
+    """Send a prompt with its own provider/model/key.
+    
+    Unlike limma's config()/generate() pair this does not touch any global
+    state, so several calls can run at the same time from different threads.
+    """
+    url, headers, payload = _build_request(provider_id, api_key, model, prompt, base_url)
+    
+    response = _session().post(url, headers=headers, json=payload, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    
+    try:
+        if provider_id == "gemini":
+            return data["candidates"][0]["content"]["parts"][0]["text"]
+        return data["choices"][0]["message"]["content"]
+    except (KeyError, IndexError):
+        raise RuntimeError(f"Unexpected {provider_id} response: {data}")
+
+
+def stream_prompt(provider_id, api_key, model, prompt, base_url=None, timeout=60):
+    """Like send_prompt, but yield the response text chunk by chunk as it arrives"""
+    url, headers, payload = _build_request(provider_id, api_key, model, prompt, base_url, stream=True)
+    
+    with _session().post(url, headers=headers, json=payload, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        
+        # chunk_size=None hands lines over as soon as they arrive instead of
+        # waiting for a full buffer, otherwise time-to-first-token is skewed
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+                
+            event = json.loads(data)
+            try:
+                if provider_id == "gemini":
+                    text = event["candidates"][0]["content"]["parts"][0].get("text", "")
+                else:
+                    text = event["choices"][0]["delta"].get("content") or ""
+            except (KeyError, IndexError):
+                continue
+            if text:
+                yield text
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English text)"""
+    return max(1, round(len(text) / 4))
+
+
+class LatencyHistogram:
+    """Fixed-memory histogram for streaming quantiles (HDR-histogram style).
+    
+    Values are counted in log-spaced buckets, so any quantile is accurate to
+    within `precision` (relative) no matter how many values are recorded, and
+    two histograms with the same settings can be merged by adding counts.
+    """
+    
+    def __init__(self, min_value=0.001, max_value=600.0, precision=0.02):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.precision = precision
+        self._log_base = math.log1p(precision)
+        self.counts = [0] * (self._bucket(max_value) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        
+    def _bucket(self, value):
+        value = min(max(value, self.min_value), self.max_value)
+        return int(math.log(value / self.min_value) / self._log_base)
+        
+    def _bucket_value(self, index):
+        # Geometric midpoint of the bucket
+        return self.min_value * math.exp((index + 0.5) * self._log_base)
+        
+    def record(self, value):
+        """Add one observation"""
+        self.counts[self._bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        
+    def quantile(self, q):
+        """Approximate q-quantile (0 <= q <= 1), or None when empty"""
+        if not self.count:
+            return None
+            
+        rank = q * (self.count - 1) + 1
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(max(self._bucket_value(index), self.min), self.max)
+        return self.max
+        
+    def mean(self):
+        return self.total / self.count if self.count else None
+        
+    def merge(self, other):
+        """Add another histogram's observations to this one"""
+        if (other.min_value, other.max_value, other.precision) != (self.min_value, self.max_value, self.precision):
+            raise ValueError("Cannot merge histograms with different bucket settings")
+            
+        for index, bucket_count in enumerate(other.counts):
+            self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+        
+    def to_dict(self):
+        """Compact, JSON-serializable form (only non-empty buckets are stored)"""
+        return {
+            "min_value": self.min_value,
+            "max_value": self.max_value,
+            "precision": self.precision,
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+            "buckets": {str(i): c for i, c in enumerate(self.counts) if c}
+        }
+        
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data["min_value"], data["max_value"], data["precision"])
+        for index, bucket_count in data["buckets"].items():
+            histogram.counts[int(index)] = bucket_count
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
+
+
+class ProviderMetrics:
+    """Latency, time-to-first-token and throughput histograms for one provider/model"""
+    
     def __init__(self):
+        self.latency = LatencyHistogram()
+        self.ttft = LatencyHistogram()
+        self.tokens_per_sec = LatencyHistogram(min_value=0.01, max_value=100000.0)
+        
+    def record(self, response_time, ttft=None, tokens_per_sec=None):
+        self.latency.record(response_time)
+        if ttft is not None:
+            self.ttft.record(ttft)
+        if tokens_per_sec is not None:
+            self.tokens_per_sec.record(tokens_per_sec)
+            
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.ttft.merge(other.ttft)
+        self.tokens_per_sec.merge(other.tokens_per_sec)
+        return self
+        
+    def to_dict(self):
+        return {
+            "latency": self.latency.to_dict(),
+            "ttft": self.ttft.to_dict(),
+            "tokens_per_sec": self.tokens_per_sec.to_dict()
+        }
+        
+    @classmethod
+    def from_dict(cls, data):
+        metrics = cls()
+        metrics.latency = LatencyHistogram.from_dict(data["latency"])
+        metrics.ttft = LatencyHistogram.from_dict(data["ttft"])
+        metrics.tokens_per_sec = LatencyHistogram.from_dict(data["tokens_per_sec"])
+        return metrics
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    
+    def handle_error(self, request, client_address):
+        # Clients cancelling streams or dropping idle keep-alive connections
+        # is expected during races and load tests
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockLLMServer:
+    """Local OpenAI- and Gemini-compatible endpoint for offline load tests.
+    
+    Requests with `contents` (Gemini) are answered in Gemini's `candidates`
+    format, all others in OpenAI's chat format, so any provider can be load
+    tested against it. Latency grows with the number of requests in flight, and anything above
+    `capacity` concurrent requests is rejected with HTTP 429, so the server
+    shows the same saturation behaviour as a real rate-limited provider.
+    """
+    
+    def __init__(self, port=0, base_latency=0.2, token_delay=0.01, capacity=8, reply_words=40):
+        self.base_latency = base_latency
+        self.token_delay = token_delay
+        self.capacity = capacity
+        self.reply_words = reply_words
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def log_message(self, format, *args):
+                pass
+                
+            def _send_json(self, status, data):
+                body = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                
+            def _send_chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode('utf-8') + data + b"\r\n")
+                self.wfile.flush()
+                
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                
+                with server._lock:
+                    if server.in_flight >= server.capacity:
+                        rejected = True
+                    else:
+                        rejected = False
+                        server.in_flight += 1
+                        load = server.in_flight / server.capacity
+                        
+                if rejected:
+                    self._send_json(429, {"error": {"message": "Rate limit exceeded"}})
+                    return
+                    
+                try:
+                    # Slow down as the server fills up
+                    time.sleep(server.base_latency * (1 + load))
+                    words = [f"word{i}" for i in range(server.reply_words)]
+                    gemini = "contents" in payload
+                    
+                    if payload.get("stream") or "alt=sse" in self.path:
+                        self.send_response(200)
+                        self.send_header("Content-Type", "text/event-stream")
+                        self.send_header("Transfer-Encoding", "chunked")
+                        self.end_headers()
+                        for word in words:
+                            if gemini:
+                                event = {"candidates": [{"content": {"parts": [{"text": word + " "}]}}]}
+                            else:
+                                event = {"choices": [{"delta": {"content": word + " "}}]}
+                            self._send_chunk(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                            time.sleep(server.token_delay)
+                        if not gemini:
+                            self._send_chunk(b"data: [DONE]\n\n")
+                        self.wfile.write(b"0\r\n\r\n")
+                    else:
+                        time.sleep(server.token_delay * len(words))
+                        text = " ".join(words)
+                        if gemini:
+                            self._send_json(200, {"candidates": [{"content": {"parts": [{"text": text}]}}]})
+                        else:
+                            self._send_json(200, {"choices": [{"message": {"content": text}}]})
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+                        
+        self._server = _QuietHTTPServer(("127.0.0.1", port), Handler)
+        self._thread = None
+        
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+        
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+        
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        
+    def __enter__(self):
+        return self.start()
+        
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class LocalQualityScorer:
+    """Reference-free and reference-based text metrics computed locally with NumPy.
+    
+    All responses are scored together: n-gram counts are built once as
+    matrices over a shared vocabulary, so ROUGE, BLEU and pairwise
+    similarity are a handful of array operations instead of per-response
+    LLM calls.
+    """
+    
+    WORD_RE = re.compile(r"[a-z0-9']+")
+    SENTENCE_RE = re.compile(r"[.!?]+(?:\s|$)")
+    VOWEL_GROUP_RE = re.compile(r"[aeiouy]+")
+    
+    def tokenize(self, text):
+        return self.WORD_RE.findall(text.lower())
+        
+    def _count_matrix(self, token_lists, n):
+        """(documents x vocabulary) matrix of n-gram counts"""
+        vocabulary = {}
+        rows, cols = [], []
+        for row, tokens in enumerate(token_lists):
+            for i in range(len(tokens) - n + 1):
+                gram = tuple(tokens[i:i + n])
+                rows.append(row)
+                cols.append(vocabulary.setdefault(gram, len(vocabulary)))
+                
+        counts = np.zeros((len(token_lists), max(len(vocabulary), 1)))
+        np.add.at(counts, (np.array(rows, dtype=int), np.array(cols, dtype=int)), 1)
+        return counts
+        
+    def _lcs_length(self, candidate, reference):
+        """Longest common subsequence, one vectorized DP row per reference token"""
+        if not candidate or not reference:
+            return 0
+        candidate = np.array(candidate)
+        row = np.zeros(len(candidate) + 1, dtype=int)
+        for token in reference:
+            match = (candidate == token).astype(int)
+            best = np.maximum(row[1:], row[:-1] + match)
+            row[1:] = np.maximum.accumulate(best)
+        return int(row[-1])
+        
+    def _syllables(self, word):
+        return max(1, len(self.VOWEL_GROUP_RE.findall(word)))
+        
+    def readability(self, text, tokens):
+        """Flesch reading ease (higher is easier) and average sentence length"""
+        sentences = max(1, len(self.SENTENCE_RE.findall(text)))
+        words = max(1, len(tokens))
+        syllables = sum(self._syllables(word) for word in tokens)
+        flesch = 206.835 - 1.015 * (words / sentences) - 84.6 * (syllables / words)
+        return flesch, words / sentences
+        
+    def score(self, responses, reference=None):
+        """Score a list of response texts
+        
+        Returns (metrics, similarity) where metrics is one dict per response
+        and similarity is the pairwise TF-IDF cosine similarity matrix.
+        """
+        tokens = [self.tokenize(text) for text in responses]
+        documents = tokens + ([self.tokenize(reference)] if reference else [])
+        
+        metrics = []
+        for text, response_tokens in zip(responses, tokens):
+            flesch, sentence_length = self.readability(text, response_tokens)
+            metrics.append({
+                "words": len(response_tokens),
+                "unique_words": len(set(response_tokens)),
+                "avg_sentence_length": sentence_length,
+                "flesch_reading_ease": flesch
+            })
+            
+        # Pairwise similarity between provider outputs (TF-IDF cosine)
+        unigrams = self._count_matrix(documents, 1)
+        response_counts = unigrams[:len(responses)]
+        document_frequency = (response_counts > 0).sum(axis=0)
+        idf = np.log((1 + len(responses)) / (1 + document_frequency)) + 1
+        tfidf = response_counts * idf
+        norms = np.linalg.norm(tfidf, axis=1, keepdims=True)
+        tfidf = np.divide(tfidf, norms, out=np.zeros_like(tfidf), where=norms > 0)
+        similarity = tfidf @ tfidf.T
+        
+        if reference:
+            reference_tokens = documents[-1]
+            candidate_lengths = np.array([len(t) for t in tokens], dtype=float)
+            
+            # ROUGE-1 / ROUGE-2 F1 and BLEU n-gram precisions share the same
+            # clipped overlap counts
+            precisions = []
+            for n in (1, 2, 3, 4):
+                counts = unigrams if n == 1 else self._count_matrix(documents, n)
+                candidate, reference_row = counts[:-1], counts[-1]
+                overlap = np.minimum(candidate, reference_row).sum(axis=1)
+                candidate_total = np.maximum(candidate_lengths - n + 1, 0)
+                
+                if n <= 2:
+                    reference_total = max(len(reference_tokens) - n + 1, 0)
+                    recall = overlap / reference_total if reference_total else np.zeros_like(overlap)
+                    precision = np.divide(overlap, candidate_total, out=np.zeros_like(overlap), where=candidate_total > 0)
+                    f1 = np.divide(2 * precision * recall, precision + recall,
+                                   out=np.zeros_like(overlap), where=(precision + recall) > 0)
+                    for m, value in zip(metrics, f1):
+                        m[f"rouge{n}_f1"] = float(value)
+                        
+                if n == 1:
+                    precisions.append(overlap / np.maximum(candidate_total, 1))
+                else:
+                    # Add-one smoothing for higher orders (BLEU+1) keeps short
+                    # answers from scoring zero
+                    precisions.append((overlap + 1) / (candidate_total + 1))
+                    
+            # No unigram overlap at all gives log(0) and a BLEU of exactly 0
+            with np.errstate(divide='ignore'):
+                log_precision = np.log(np.vstack(precisions)).mean(axis=0)
+            brevity = np.where(
+                candidate_lengths >= len(reference_tokens),
+                1.0,
+                np.exp(1 - len(reference_tokens) / np.maximum(candidate_lengths, 1))
+            )
+            bleu = brevity * np.exp(log_precision)
+            
+            for m, response_tokens, value in zip(metrics, tokens, bleu):
+                m["bleu"] = float(value)
+                lcs = self._lcs_length(response_tokens, reference_tokens)
+                precision = lcs / len(response_tokens) if response_tokens else 0.0
+                recall = lcs / len(reference_tokens) if reference_tokens else 0.0
+                m["rougeL_f1"] = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+                
+        return metrics, similarity
+
+
+class ResultsStore:
+    """Persistent, indexed history of comparison results in SQLite.
+    
+    Results are written one row at a time as they come in, and history,
+    trends and exports are answered with SQL queries so months of data
+    never have to be loaded into memory.
+    """
+    
+    COLUMNS = [
+        "timestamp", "provider", "model", "prompt_hash", "prompt", "response",
+        "response_time", "ttft", "tokens", "tokens_per_sec", "word_count", "char_count"
+    ]
+    
+    def __init__(self, db_path="comparison_history.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # WAL keeps readers from blocking the incremental writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                prompt TEXT,
+                response TEXT,
+                response_time REAL,
+                ttft REAL,
+                tokens INTEGER,
+                tokens_per_sec REAL,
+                word_count INTEGER,
+                char_count INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_results_provider ON results (provider, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_results_model ON results (model, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_results_timestamp ON results (timestamp);
+            CREATE INDEX IF NOT EXISTS idx_results_prompt_hash ON results (prompt_hash);
+        """)
+        self._conn.commit()
+        
+    @staticmethod
+    def prompt_hash(prompt):
+        return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        
+    def add(self, result, prompt):
+        """Store one result"""
+        row = dict(result, prompt=prompt, prompt_hash=self.prompt_hash(prompt))
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO results ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                [row.get(column) for column in self.COLUMNS]
+            )
+            self._conn.commit()
+            
+    def _query(self, sql, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [d[0] for d in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            
+    def recent(self, limit=10):
+        """Latest results, newest first"""
+        return self._query(
+            "SELECT timestamp, provider, model, response_time, word_count FROM results "
+            "ORDER BY timestamp DESC LIMIT ?",
+            (limit,)
+        )
+        
+    def provider_summary(self, since=None):
+        """Aggregate statistics per provider/model, optionally since an ISO timestamp"""
+        return self._query(
+            "SELECT provider, model, COUNT(*) AS count, AVG(response_time) AS avg_time, "
+            "MIN(response_time) AS min_time, MAX(response_time) AS max_time, "
+            "AVG(ttft) AS avg_ttft, AVG(tokens_per_sec) AS avg_tokens_per_sec, AVG(word_count) AS avg_words "
+            "FROM results WHERE timestamp >= ? GROUP BY provider, model ORDER BY avg_time",
+            (since or "",)
+        )
+        
+    def trend(self, period="month", since=None):
+        """Average response time per provider/model for each day or month"""
+        length = 7 if period == "month" else 10
+        return self._query(
+            f"SELECT substr(timestamp, 1, {length}) AS period, provider, model, COUNT(*) AS count, "
+            "AVG(response_time) AS avg_time FROM results WHERE timestamp >= ? "
+            "GROUP BY period, provider, model ORDER BY period, provider",
+            (since or "",)
+        )
+        
+    def _iter_rows(self, since=None, batch_size=1000):
+        """Yield batches of result rows without loading the whole table"""
+        # A separate connection keeps a long export from holding the write lock
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM results WHERE timestamp >= ? ORDER BY id",
+                (since or "",)
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+            
+    def export_csv(self, filename, since=None):
+        """Stream the full history to a CSV file"""
+        count = 0
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.COLUMNS)
+            for rows in self._iter_rows(since):
+                writer.writerows(rows)
+                count += len(rows)
+        return count
+        
+    def export_parquet(self, filename, since=None):
+        """Stream the full history to a Parquet file (needs pyarrow)"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+            
+        schema = pa.schema([
+            ("timestamp", pa.string()), ("provider", pa.string()), ("model", pa.string()),
+            ("prompt_hash", pa.string()), ("prompt", pa.string()), ("response", pa.string()),
+            ("response_time", pa.float64()), ("ttft", pa.float64()), ("tokens", pa.int64()),
+            ("tokens_per_sec", pa.float64()), ("word_count", pa.int64()), ("char_count", pa.int64())
+        ])
+        count = 0
+        with pq.ParquetWriter(filename, schema) as writer:
+            for rows in self._iter_rows(since):
+                columns = list(zip(*rows))
+                writer.write_table(pa.table(
+                    {name: list(values) for name, values in zip(self.COLUMNS, columns)},
+                    schema=schema
+                ))
+                count += len(rows)
+        return count
+        
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class AIComparisonTool:
+    def __init__(self, db_path="comparison_history.db"):
         self.providers = {
             "openai": {
                 "name": "OpenAI",
@@ -35,8 +668,24 @@ class AIComparisonTool:
             }
         }
         
-        self.results = []
-        self.metrics = defaultdict(list)
+        # Recent results only; the full history lives in the SQLite store
+        self.results = deque(maxlen=1000)
+        self.store = ResultsStore(db_path)
+        # "provider (model)" -> ProviderMetrics
+        self.metrics = defaultdict(ProviderMetrics)
+        self._lock = threading.Lock()
+        # Stream responses so time-to-first-token can be measured
+        self.stream_responses = True
+        
+        # Race/hedge bookkeeping: wins and losses per provider, and a
+        # per-primary multiplier on its p95 that tunes the hedge delay
+        self.race_stats = defaultdict(lambda: {"wins": 0, "losses": 0})
+        self.hedge_stats = defaultdict(lambda: {"requests": 0, "hedged": 0, "backup_wins": 0, "multiplier": 1.0})
+        self.default_hedge_delay = 2.0
+        
+        self.quality_scorer = LocalQualityScorer()
+        self.judge_cache_file = "judge_cache.json"
+        self._judge_cache = None
         
     def setup_providers(self):
         """Interactive provider setup"""
@@ -58,44 +707,80 @@ class AIComparisonTool:
                 model_choice = int(input("Select model (1-2): ")) - 1
                 provider['selected_model'] = provider['models'][model_choice]
                 
-    def test_provider(self, provider_id, prompt):
-        """Test a single provider with a prompt"""
+    def test_provider(self, provider_id, prompt, record=True, cancel_event=None):
+        """Test a single provider with a prompt
+        
+        record=False runs the request without adding it to the history or
+        metrics (used for benchmark warm-up calls). When cancel_event is set
+        while a response is streaming, the request is abandoned and None is
+        returned.
+        """
         provider = self.providers[provider_id]
         
         if not provider['enabled']:
             return None
             
         try:
-            # Configure provider
-            config(
-                provider=provider_id,
-                api_key=provider['api_key'],
-                model=provider['selected_model']
+            # Time the response (each call carries its own provider context,
+            # so this is safe to run from several threads at once)
+            request = (
+                provider_id,
+                provider['api_key'],
+                provider['selected_model'],
+                prompt
             )
-            
-            # Time the response
-            start_time = time.time()
-            response = generate(prompt)
-            end_time = time.time()
+            ttft = None
+            start_time = time.perf_counter()
+            if self.stream_responses:
+                chunks = []
+                stream = stream_prompt(*request, base_url=provider.get('base_url'))
+                try:
+                    for chunk in stream:
+                        if cancel_event is not None and cancel_event.is_set():
+                            return None
+                        if ttft is None:
+                            ttft = time.perf_counter() - start_time
+                        chunks.append(chunk)
+                finally:
+                    # Closes the HTTP connection early when cancelled
+                    stream.close()
+                response = "".join(chunks)
+            else:
+                response = send_prompt(*request, base_url=provider.get('base_url'))
+            end_time = time.perf_counter()
             
             response_time = end_time - start_time
             word_count = len(response.split())
             char_count = len(response)
+            tokens = estimate_tokens(response)
+            # Generation speed after the first token when we know it
+            generation_time = response_time - ttft if ttft is not None else response_time
+            tokens_per_sec = tokens / generation_time if generation_time > 0 else None
             
             result = {
                 "provider": provider['name'],
                 "model": provider['selected_model'],
                 "response": response,
                 "response_time": response_time,
+                "ttft": ttft,
+                "tokens": tokens,
+                "tokens_per_sec": tokens_per_sec,
                 "word_count": word_count,
                 "char_count": char_count,
                 "timestamp": datetime.now().isoformat()
             }
             
-            self.results.append(result)
-            
-            # Update metrics
-            self.metrics[provider['name']].append(response_time)
+            if not record:
+                return result
+                
+            with self._lock:
+                self.results.append(result)
+                
+                # Update metrics
+                metrics_key = f"{provider['name']} ({provider['selected_model']})"
+                self.metrics[metrics_key].record(response_time, ttft, tokens_per_sec)
+                
+            self.store.add(result, prompt)
             
             return result
             
@@ -103,25 +788,171 @@ class AIComparisonTool:
             print(f"Error testing {provider['name']}: {e}")
             return None
             
-    def compare_all(self, prompt):
-        """Compare all enabled providers"""
+    def compare_all(self, prompt, concurrent=True):
+        """Compare all enabled providers
+        
+        With concurrent=True every provider gets the prompt at the same time,
+        so the comparison takes as long as the slowest provider instead of
+        the sum of all of them.
+        """
         print(f"\n📊 Comparing AI Providers for prompt: '{prompt}'")
         print("=" * 60)
         
+        enabled = [pid for pid in self.providers if self.providers[pid]['enabled']]
         results = []
-        for provider_id in self.providers:
-            if self.providers[provider_id]['enabled']:
+        
+        if not concurrent or len(enabled) < 2:
+            for provider_id in enabled:
                 print(f"\nTesting {self.providers[provider_id]['name']}...")
                 result = self.test_provider(provider_id, prompt)
                 if result:
                     results.append(result)
                     print(f"  ✅ Response time: {result['response_time']:.2f}s")
+                    if result['ttft'] is not None:
+                        print(f"  ⚡ First token: {result['ttft']:.2f}s")
+                    print(f"  📝 Words: {result['word_count']}")
+            return results
+            
+        print(f"\nTesting {len(enabled)} providers concurrently...")
+        wall_start = time.perf_counter()
+        
+        with ThreadPoolExecutor(max_workers=len(enabled)) as pool:
+            futures = {pool.submit(self.test_provider, pid, prompt): pid for pid in enabled}
+            for future in as_completed(futures):
+                result = future.result()
+                if result:
+                    results.append(result)
+                    print(f"\n{result['provider']}:")
+                    print(f"  ✅ Response time: {result['response_time']:.2f}s")
+                    if result['ttft'] is not None:
+                        print(f"  ⚡ First token: {result['ttft']:.2f}s")
                     print(f"  📝 Words: {result['word_count']}")
                     
+        wall_time = time.perf_counter() - wall_start
+        total_time = sum(r['response_time'] for r in results)
+        print(f"\n⏱️  Wall time: {wall_time:.2f}s (sequential would take ~{total_time:.2f}s)")
+        
         return results
         
-    def display_comparison(self, results):
-        """Display comparison results"""
+    def race(self, prompt, provider_ids=None):
+        """Send the prompt to several providers and keep the first complete answer
+        
+        The remaining requests are cancelled (streaming) or ignored, and every
+        provider's win or loss is recorded in race_stats.
+        """
+        provider_ids = provider_ids or [pid for pid in self.providers if self.providers[pid]['enabled']]
+        if not provider_ids:
+            print("No providers enabled")
+            return None
+            
+        cancel = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=len(provider_ids))
+        futures = {pool.submit(self.test_provider, pid, prompt, True, cancel): pid for pid in provider_ids}
+        
+        winner = None
+        for future in as_completed(futures):
+            result = future.result()
+            if result:
+                winner = result
+                cancel.set()
+                break
+                
+        # Don't wait for the losers; they stop at their next streamed chunk
+        pool.shutdown(wait=False)
+        
+        with self._lock:
+            for provider_id in provider_ids:
+                name = self.providers[provider_id]['name']
+                if winner and name == winner['provider']:
+                    self.race_stats[name]["wins"] += 1
+                else:
+                    self.race_stats[name]["losses"] += 1
+                    
+        return winner
+        
+    def hedge_delay(self, provider_id):
+        """How long to wait for a provider before firing a backup request
+        
+        Starts from the provider's observed p95 latency and is scaled by a
+        multiplier that shrinks when backups keep winning and grows when
+        they turn out to be wasted.
+        """
+        provider = self.providers[provider_id]
+        key = f"{provider['name']} ({provider.get('selected_model')})"
+        with self._lock:
+            latency = self.metrics[key].latency if key in self.metrics else None
+            multiplier = self.hedge_stats[provider_id]["multiplier"]
+            
+        # Too few samples for a meaningful p95
+        if latency is None or latency.count < 5:
+            return self.default_hedge_delay
+        return latency.quantile(0.95) * multiplier
+        
+    def hedged(self, prompt, primary, backup):
+        """Ask the primary provider and only fire a backup once it runs past its p95
+        
+        Returns the first complete answer.
+        """
+        delay = self.hedge_delay(primary)
+        cancel = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=2)
+        primary_future = pool.submit(self.test_provider, primary, prompt, True, cancel)
+        
+        done, _ = wait([primary_future], timeout=delay)
+        stats = self.hedge_stats[primary]
+        
+        if done and primary_future.result():
+            pool.shutdown(wait=False)
+            with self._lock:
+                stats["requests"] += 1
+            return primary_future.result()
+            
+        # Primary is slow (or failed): race it against the backup
+        backup_future = pool.submit(self.test_provider, backup, prompt, True, cancel)
+        winner = None
+        winner_future = None
+        for future in as_completed([primary_future, backup_future]):
+            result = future.result()
+            if result:
+                winner, winner_future = result, future
+                cancel.set()
+                break
+        pool.shutdown(wait=False)
+        
+        with self._lock:
+            stats["requests"] += 1
+            stats["hedged"] += 1
+            if winner_future is backup_future:
+                stats["backup_wins"] += 1
+                # Backups pay off: hedge earlier next time
+                stats["multiplier"] = max(0.5, stats["multiplier"] * 0.9)
+            elif winner_future is primary_future:
+                # The extra request was wasted: hedge later next time
+                stats["multiplier"] = min(2.0, stats["multiplier"] * 1.1)
+                
+            for provider_id, future in ((primary, primary_future), (backup, backup_future)):
+                name = self.providers[provider_id]['name']
+                self.race_stats[name]["wins" if future is winner_future else "losses"] += 1
+                
+        return winner
+        
+    def display_race_stats(self):
+        """Print race wins and hedge statistics"""
+        if self.race_stats:
+            print("\n=== Race Results ===")
+            for name, stats in self.race_stats.items():
+                total = stats['wins'] + stats['losses']
+                print(f"{name}: won {stats['wins']}/{total}")
+        for provider_id, stats in self.hedge_stats.items():
+            print(f"Hedging {self.providers[provider_id]['name']}: {stats['hedged']}/{stats['requests']} hedged, "
+                  f"backup won {stats['backup_wins']}, next delay {self.hedge_delay(provider_id):.2f}s")
+                  
+    def display_comparison(self, results, benchmark=None):
+        """Display comparison results
+        
+        A "Fastest" winner is only declared when a benchmark shows the
+        difference to every other provider is statistically significant.
+        """
         if not results:
             print("No results to display")
             return
@@ -130,59 +961,293 @@ class AIComparisonTool:
         print("COMPARISON RESULTS")
         print("="*70)
         
-        # Sort by response time
-        sorted_results = sorted(results, key=lambda x: x['response_time'])
+        stats = benchmark['stats'] if benchmark else {}
+        
+        # Sort by median response time when we have one, otherwise by this run
+        def sort_key(result):
+            if result['provider'] in stats:
+                return stats[result['provider']]['median']
+            return result['response_time']
+        sorted_results = sorted(results, key=sort_key)
         
         for i, result in enumerate(sorted_results, 1):
             print(f"\n{i}. {result['provider']} ({result['model']})")
-            print(f"   ⏱️  Response time: {result['response_time']:.2f}s")
+            provider_stats = stats.get(result['provider'])
+            if provider_stats:
+                print(f"   ⏱️  Median response time: {provider_stats['median']:.2f}s "
+                      f"({benchmark['confidence']:.0%} CI {provider_stats['ci_low']:.2f}-{provider_stats['ci_high']:.2f}s, "
+                      f"n={provider_stats['n']})")
+            else:
+                print(f"   ⏱️  Response time: {result['response_time']:.2f}s")
+            if result.get('ttft') is not None and result.get('tokens_per_sec') is not None:
+                print(f"   ⚡ First token: {result['ttft']:.2f}s | {result['tokens_per_sec']:.1f} tokens/s")
             print(f"   📊 Words: {result['word_count']} | Characters: {result['char_count']}")
             print(f"   💬 Response preview: {result['response'][:200]}...")
             
         # Winner
-        fastest = sorted_results[0]
         most_words = max(results, key=lambda x: x['word_count'])
         
         print("\n" + "🏆" * 20)
-        print(f"Fastest: {fastest['provider']} ({fastest['response_time']:.2f}s)")
+        if benchmark and benchmark['fastest']:
+            fastest = benchmark['fastest']
+            print(f"Fastest: {fastest} (median {stats[fastest]['median']:.2f}s, "
+                  f"p < {benchmark['alpha']} against every other provider)")
+        elif benchmark:
+            print("Fastest: no statistically significant difference between providers")
+        elif len(results) > 1:
+            print("Fastest: undetermined (one sample per provider; run a benchmark for a significant result)")
         print(f"Most verbose: {most_words['provider']} ({most_words['word_count']} words)")
         print("🏆" * 20)
         
-    def analyze_quality(self, results, criteria):
-        """Analyze response quality based on criteria"""
+    @staticmethod
+    def _median(values):
+        ordered = sorted(values)
+        middle = len(ordered) // 2
+        if len(ordered) % 2:
+            return ordered[middle]
+        return (ordered[middle - 1] + ordered[middle]) / 2
+        
+    def _bootstrap_ci(self, values, confidence, rng, resamples=2000):
+        """Percentile bootstrap confidence interval for the median"""
+        n = len(values)
+        medians = sorted(
+            self._median([values[rng.randrange(n)] for _ in range(n)])
+            for _ in range(resamples)
+        )
+        tail = (1 - confidence) / 2
+        low = medians[int(tail * (resamples - 1))]
+        high = medians[int((1 - tail) * (resamples - 1))]
+        return low, high
+        
+    @staticmethod
+    def _mann_whitney(a, b):
+        """Two-sided Mann-Whitney U test (normal approximation with tie correction)
+        
+        Returns (U statistic for `a`, p-value).
+        """
+        n1, n2 = len(a), len(b)
+        combined = sorted([(value, 0) for value in a] + [(value, 1) for value in b])
+        
+        # Average ranks for tied values
+        ranks = [0.0] * len(combined)
+        tie_term = 0
+        i = 0
+        while i < len(combined):
+            j = i
+            while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+                j += 1
+            for k in range(i, j + 1):
+                ranks[k] = (i + j) / 2 + 1
+            tied = j - i + 1
+            tie_term += tied ** 3 - tied
+            i = j + 1
+            
+        rank_sum_a = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 0)
+        u = rank_sum_a - n1 * (n1 + 1) / 2
+        
+        n = n1 + n2
+        mean_u = n1 * n2 / 2
+        var_u = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+        if var_u <= 0:
+            return u, 1.0
+            
+        # Continuity correction
+        z = (abs(u - mean_u) - 0.5) / math.sqrt(var_u)
+        p_value = min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
+        return u, p_value
+        
+    def benchmark(self, prompt, repetitions=10, warmup=1, order="random", confidence=0.95, alpha=0.05, seed=None):
+        """Repeatedly time all enabled providers and test whether one is really faster
+        
+        Each provider gets `warmup` unrecorded calls, then `repetitions` timed
+        rounds. order="random" shuffles providers every round, "interleaved"
+        rotates them so each provider takes every position equally often, and
+        "fixed" keeps the configured order. Returns per-provider medians with
+        bootstrap confidence intervals and pairwise Mann-Whitney U tests.
+        """
+        if order not in ("random", "interleaved", "fixed"):
+            raise ValueError("order must be 'random', 'interleaved' or 'fixed'")
+            
+        rng = random.Random(seed)
+        enabled = [pid for pid in self.providers if self.providers[pid]['enabled']]
+        if not enabled:
+            print("No providers enabled")
+            return None
+            
+        print(f"\n🔬 Benchmarking {len(enabled)} providers: {warmup} warm-up + {repetitions} timed calls each ({order} order)")
+        
+        for _ in range(warmup):
+            for provider_id in enabled:
+                self.test_provider(provider_id, prompt, record=False)
+                
+        times = defaultdict(list)
+        latest = {}
+        for round_number in range(repetitions):
+            if order == "random":
+                round_order = rng.sample(enabled, len(enabled))
+            elif order == "interleaved":
+                shift = round_number % len(enabled)
+                round_order = enabled[shift:] + enabled[:shift]
+            else:
+                round_order = enabled
+                
+            for provider_id in round_order:
+                result = self.test_provider(provider_id, prompt)
+                if result:
+                    times[result['provider']].append(result['response_time'])
+                    latest[result['provider']] = result
+            print(f"  Round {round_number + 1}/{repetitions} done")
+            
+        stats = {}
+        for provider, values in times.items():
+            low, high = self._bootstrap_ci(values, confidence, rng)
+            stats[provider] = {
+                "n": len(values),
+                "median": self._median(values),
+                "mean": sum(values) / len(values),
+                "ci_low": low,
+                "ci_high": high,
+                "times": values
+            }
+            
+        providers = sorted(stats, key=lambda name: stats[name]['median'])
+        comparisons = []
+        for i, first in enumerate(providers):
+            for second in providers[i + 1:]:
+                u, p_value = self._mann_whitney(times[first], times[second])
+                comparisons.append({
+                    "faster": first,
+                    "slower": second,
+                    "u": u,
+                    "p_value": p_value
+                })
+                
+        # The fastest provider wins only if it beats every other one, with a
+        # Bonferroni correction for the number of comparisons
+        fastest = None
+        if len(providers) > 1:
+            threshold = alpha / (len(providers) - 1)
+            against_fastest = [c for c in comparisons if c['faster'] == providers[0]]
+            if all(c['p_value'] < threshold for c in against_fastest):
+                fastest = providers[0]
+                
+        return {
+            "prompt": prompt,
+            "repetitions": repetitions,
+            "warmup": warmup,
+            "order": order,
+            "confidence": confidence,
+            "alpha": alpha,
+            "stats": stats,
+            "comparisons": comparisons,
+            "fastest": fastest,
+            "results": [latest[name] for name in providers]
+        }
+        
+    def analyze_quality(self, results, criteria, reference=None, use_judge=False, max_workers=4):
+        """Analyze response quality based on criteria
+        
+        Local metrics (length, readability, pairwise similarity, and
+        ROUGE/BLEU when a reference answer is given) are always computed in
+        one pass. With use_judge=True an LLM additionally rates every
+        response; those calls run in parallel and verdicts are cached by
+        (response hash, criteria).
+        """
         print(f"\n📈 Quality Analysis based on: {criteria}")
         
+        metrics, similarity = self.quality_scorer.score([r['response'] for r in results], reference)
+        
         analysis_results = []
-        for result in results:
-            # Use AI to evaluate quality
+        for i, (result, m) in enumerate(zip(results, metrics)):
+            others = [similarity[i][j] for j in range(len(results)) if j != i]
+            analysis = {
+                "provider": result['provider'],
+                "metrics": m,
+                "avg_similarity_to_others": float(np.mean(others)) if others else None
+            }
+            analysis_results.append(analysis)
+            
+        if use_judge:
+            evaluations = self._judge_all([r['response'] for r in results], criteria, max_workers)
+            for analysis, evaluation in zip(analysis_results, evaluations):
+                analysis['evaluation'] = evaluation
+                
+        for analysis in analysis_results:
+            m = analysis['metrics']
+            print(f"\n{analysis['provider']}:")
+            print(f"  📏 {m['words']} words, {m['unique_words']} unique | "
+                  f"avg sentence {m['avg_sentence_length']:.1f} words | Flesch {m['flesch_reading_ease']:.0f}")
+            if reference:
+                print(f"  🎯 ROUGE-1 {m['rouge1_f1']:.3f} | ROUGE-2 {m['rouge2_f1']:.3f} | "
+                      f"ROUGE-L {m['rougeL_f1']:.3f} | BLEU {m['bleu']:.3f}")
+            if analysis['avg_similarity_to_others'] is not None:
+                print(f"  🔗 Similarity to other providers: {analysis['avg_similarity_to_others']:.2f}")
+            if 'evaluation' in analysis:
+                print(f"  🧑‍⚖️ {analysis['evaluation']}")
+                
+        return {
+            "criteria": criteria,
+            "analysis": analysis_results,
+            "similarity": similarity.tolist()
+        }
+        
+    def _judge_provider(self):
+        """Pick the provider used as LLM judge: Gemini if configured, else any enabled one"""
+        gemini = self.providers['gemini']
+        if gemini['api_key']:
+            return "gemini", gemini['api_key'], gemini.get('selected_model', "gemini-2.5-flash")
+        for provider_id, provider in self.providers.items():
+            if provider['enabled']:
+                return provider_id, provider['api_key'], provider['selected_model']
+        return None
+        
+    def _load_judge_cache(self):
+        if self._judge_cache is None:
+            self._judge_cache = {}
+            if os.path.exists(self.judge_cache_file):
+                with open(self.judge_cache_file, 'r') as f:
+                    self._judge_cache = json.load(f)
+        return self._judge_cache
+        
+    def _judge_all(self, responses, criteria, max_workers):
+        """Rate responses with an LLM in parallel, reusing cached verdicts"""
+        judge = self._judge_provider()
+        if not judge:
+            return ["Evaluation failed: no provider configured for judging"] * len(responses)
+        provider_id, api_key, model = judge
+        
+        cache = self._load_judge_cache()
+        normalized_criteria = " ".join(criteria.lower().split())
+        keys = [
+            f"{hashlib.sha256(response.encode('utf-8')).hexdigest()}:{normalized_criteria}"
+            for response in responses
+        ]
+        
+        def evaluate(response):
             eval_prompt = f"""Evaluate this response based on: {criteria}
             Rate it 1-10 and explain briefly.
             
-            Response: {result['response']}
+            Response: {response}
             
             Format: Score: [1-10], Brief explanation:"""
-            
             try:
-                config(
-                    provider="gemini",  # Use a free provider for evaluation
-                    api_key=self.providers['gemini']['api_key'],
-                    model="gemini-2.5-flash"
-                )
-                evaluation = generate(eval_prompt)
+                return send_prompt(provider_id, api_key, model, eval_prompt)
+            except Exception:
+                return None
                 
-                analysis_results.append({
-                    "provider": result['provider'],
-                    "evaluation": evaluation
-                })
-            except:
-                analysis_results.append({
-                    "provider": result['provider'],
-                    "evaluation": "Evaluation failed"
-                })
+        missing = {key: response for key, response in zip(keys, responses) if key not in cache}
+        if missing:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                verdicts = pool.map(evaluate, missing.values())
+                for key, verdict in zip(missing, verdicts):
+                    if verdict is not None:
+                        cache[key] = verdict
+                        
+            with open(self.judge_cache_file, 'w') as f:
+                json.dump(cache, f)
                 
-        for ar in analysis_results:
-            print(f"\n{ar['provider']}: {ar['evaluation']}")
-            
+        return [cache.get(key, "Evaluation failed") for key in keys]
+        
     def export_results(self, results, filename=None):
         """Export results to file"""
         if not filename:
@@ -198,6 +1263,75 @@ class AIComparisonTool:
             
         print(f"\n💾 Results exported to {filename}")
         
+    def export_metrics(self, filename=None):
+        """Export latency histograms so they can be merged into later runs"""
+        if not filename:
+            filename = f"metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            
+        with self._lock:
+            export_data = {key: metrics.to_dict() for key, metrics in self.metrics.items()}
+            
+        with open(filename, 'w') as f:
+            json.dump(export_data, f)
+            
+        print(f"\n💾 Metrics exported to {filename}")
+        
+    def merge_metrics(self, filename):
+        """Merge histograms exported by a previous run into the current metrics"""
+        with open(filename, 'r') as f:
+            data = json.load(f)
+            
+        with self._lock:
+            for key, metrics_data in data.items():
+                self.metrics[key].merge(ProviderMetrics.from_dict(metrics_data))
+                
+        print(f"\n📥 Merged metrics for {len(data)} provider/models from {filename}")
+        
+    def show_performance_trends(self):
+        """Print tail latency, time-to-first-token and throughput per provider/model"""
+        def fmt(value, unit="s"):
+            return f"{value:.2f}{unit}" if value is not None else "n/a"
+            
+        print("\n=== Performance Trends (this session) ===")
+        for key, metrics in self.metrics.items():
+            latency = metrics.latency
+            print(f"\n{key} ({latency.count} tests)")
+            print(f"  Latency  p50 {fmt(latency.quantile(0.5))} | p95 {fmt(latency.quantile(0.95))} | "
+                  f"p99 {fmt(latency.quantile(0.99))} | mean {fmt(latency.mean())}")
+            if metrics.ttft.count:
+                print(f"  TTFT     p50 {fmt(metrics.ttft.quantile(0.5))} | p95 {fmt(metrics.ttft.quantile(0.95))} | "
+                      f"p99 {fmt(metrics.ttft.quantile(0.99))}")
+            if metrics.tokens_per_sec.count:
+                print(f"  Tokens/s p50 {fmt(metrics.tokens_per_sec.quantile(0.5), '')} | "
+                      f"p5 {fmt(metrics.tokens_per_sec.quantile(0.05), '')}")
+                      
+    def show_history_trends(self, period="month"):
+        """Print all-time averages and per-period trends from the results store"""
+        summary = self.store.provider_summary()
+        if not summary:
+            print("No stored history yet")
+            return
+            
+        print("\n=== Performance Trends (all history) ===")
+        for row in summary:
+            ttft = f" | first token {row['avg_ttft']:.2f}s" if row['avg_ttft'] is not None else ""
+            print(f"{row['provider']} ({row['model']}): avg {row['avg_time']:.2f}s over {row['count']} tests "
+                  f"(min {row['min_time']:.2f}s, max {row['max_time']:.2f}s){ttft}")
+                  
+        print(f"\nBy {period}:")
+        for row in self.store.trend(period):
+            print(f"  {row['period']}  {row['provider']} ({row['model']}): avg {row['avg_time']:.2f}s, {row['count']} tests")
+            
+    def _save_chart(self, prefix):
+        """Save the current matplotlib figure with a timestamped name and show it"""
+        plt.tight_layout()
+        
+        chart_file = f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+        plt.savefig(chart_file)
+        print(f"\n📊 Chart saved to {chart_file}")
+        plt.show()
+        return chart_file
+        
     def plot_comparison(self, results):
         """Create visual comparison chart"""
         providers = [r['provider'] for r in results]
@@ -220,38 +1354,185 @@ class AIComparisonTool:
         ax2.set_ylabel('Word Count')
         ax2.tick_params(axis='x', rotation=45)
         
-        plt.tight_layout()
-        
         # Save chart
-        chart_file = f"comparison_chart_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-        plt.savefig(chart_file)
-        print(f"\n📊 Chart saved to {chart_file}")
-        plt.show()
+        self._save_chart("comparison_chart")
         
-    def batch_comparison(self, prompts_file):
-        """Compare multiple prompts"""
+    def plot_load_test(self, report):
+        """Chart latency percentiles and error rates against offered load"""
+        steps = report['steps']
+        offered = [step['offered'] for step in steps]
+        label = "Target QPS" if report['mode'] == "open" else "Concurrent workers"
+        
+        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+        
+        # Latency vs load
+        for q in ("p50", "p95", "p99"):
+            ax1.plot(offered, [step[q] for step in steps], marker='o', label=q)
+        ax1.set_title(f"Latency vs Load ({report['provider']})")
+        ax1.set_xlabel(label)
+        ax1.set_ylabel('Time (seconds)')
+        ax1.legend()
+        
+        # Throughput and errors vs load
+        ax2.plot(offered, [step['throughput'] for step in steps], marker='o', color='green', label='Achieved QPS')
+        ax2.set_xlabel(label)
+        ax2.set_ylabel('Requests / second')
+        ax2.set_title('Throughput and Error Rate')
+        ax3 = ax2.twinx()
+        ax3.plot(offered, [step['error_rate'] * 100 for step in steps], marker='x', color='red', label='Errors %')
+        ax3.plot(offered, [step['rate_limited_rate'] * 100 for step in steps], marker='x', color='orange', label='429 %')
+        ax3.set_ylabel('Percent of requests')
+        ax2.legend(loc='upper left')
+        ax3.legend(loc='upper right')
+        
+        self._save_chart("loadtest_chart")
+        
+    def _stream_prompts(self, prompts_file):
+        """Yield (index, prompt) pairs without reading the whole file"""
         with open(prompts_file, 'r') as f:
-            prompts = [line.strip() for line in f if line.strip()]
+            index = 0
+            for line in f:
+                prompt = line.strip()
+                if prompt:
+                    index += 1
+                    yield index, prompt
+                    
+    def _checkpoint_key(self, index, prompt, provider_id):
+        """Identify one (prompt, provider) job so a restart can skip it"""
+        prompt_hash = hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:12]
+        return f"{index}:{prompt_hash}:{provider_id}"
+        
+    def _load_checkpoint(self, checkpoint_file):
+        """Return the keys of jobs that already finished successfully"""
+        done = set()
+        if not os.path.exists(checkpoint_file):
+            return done
             
-        all_results = []
+        with open(checkpoint_file, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash can leave a half-written last line
+                    continue
+                if record.get('status') == 'ok':
+                    done.add(record['key'])
+        return done
         
-        for i, prompt in enumerate(prompts, 1):
-            print(f"\n[{i}/{len(prompts)}] Testing prompt: {prompt}")
-            results = self.compare_all(prompt)
-            all_results.append({
-                "prompt": prompt,
-                "results": results
-            })
+    def batch_comparison(self, prompts_file, checkpoint_file=None, max_workers=8, provider_limits=None):
+        """Compare multiple prompts
+        
+        Prompts are streamed from the file and run on a bounded worker pool.
+        Every result is appended to a JSONL checkpoint as soon as it completes,
+        and running the same batch again resumes from that checkpoint.
+        provider_limits maps provider ids to their maximum number of
+        concurrent requests. Each provider has its own queue and a job is
+        only handed to the pool once its provider has a free slot, so a
+        slow or tightly limited provider never holds workers that other
+        providers' jobs could use.
+        
+        Returns [{"prompt": ..., "results": [...]}, ...] in prompt order,
+        including results from earlier runs read back from the checkpoint.
+        """
+        if not checkpoint_file:
+            checkpoint_file = f"{prompts_file}.checkpoint.jsonl"
+            
+        enabled = [pid for pid in self.providers if self.providers[pid]['enabled']]
+        if not enabled:
+            print("No providers enabled")
+            return []
             
-        # Summary statistics
+        provider_limits = provider_limits or {}
+        limits = {pid: max(1, min(provider_limits.get(pid, max_workers), max_workers)) for pid in enabled}
+        # Jobs wait in their provider's queue until it has a free slot. Each
+        # queue holds at most a couple of jobs per worker so a huge prompts
+        # file never ends up in memory
+        queues = {pid: deque() for pid in enabled}
+        in_flight = {pid: 0 for pid in enabled}
+        dispatch_lock = threading.Condition()
+        write_lock = threading.Lock()
+        
+        done = self._load_checkpoint(checkpoint_file)
+        if done:
+            print(f"\n♻️  Resuming: {len(done)} results already in {checkpoint_file}")
+            
+        progress = {"completed": 0, "failed": 0}
+        
+        def dispatch(provider_id):
+            # Called with dispatch_lock held
+            while queues[provider_id] and in_flight[provider_id] < limits[provider_id]:
+                in_flight[provider_id] += 1
+                pool.submit(run_job, *queues[provider_id].popleft())
+                
+        def run_job(key, index, prompt, provider_id):
+            try:
+                result = self.test_provider(provider_id, prompt)
+                
+                record = {
+                    "key": key,
+                    "index": index,
+                    "prompt": prompt,
+                    "provider_id": provider_id,
+                    "status": "ok" if result else "error",
+                    "result": result
+                }
+                with write_lock:
+                    checkpoint.write(json.dumps(record) + "\n")
+                    checkpoint.flush()
+                    
+                    if result:
+                        progress["completed"] += 1
+                        print(f"[{progress['completed']} done] #{index} {result['provider']}: {result['response_time']:.2f}s")
+                    else:
+                        progress["failed"] += 1
+            finally:
+                with dispatch_lock:
+                    in_flight[provider_id] -= 1
+                    dispatch(provider_id)
+                    dispatch_lock.notify_all()
+                    
+        with open(checkpoint_file, 'a') as checkpoint:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                for index, prompt in self._stream_prompts(prompts_file):
+                    for provider_id in enabled:
+                        key = self._checkpoint_key(index, prompt, provider_id)
+                        if key in done:
+                            continue
+                        with dispatch_lock:
+                            while len(queues[provider_id]) >= max_workers * 2:
+                                dispatch_lock.wait()
+                            queues[provider_id].append((key, index, prompt, provider_id))
+                            dispatch(provider_id)
+                            
+                # Queued jobs are submitted by finishing ones, so wait for
+                # them all before the pool shuts down
+                with dispatch_lock:
+                    while any(queues.values()) or any(in_flight.values()):
+                        dispatch_lock.wait()
+                        
+                        
+        if progress["failed"]:
+            print(f"\n⚠️  {progress['failed']} requests failed; run the batch again to retry them")
+            
+        # Summary statistics, read back from the checkpoint so resumed
+        # results are included without keeping everything in memory
         print("\n" + "="*70)
         print("BATCH COMPARISON SUMMARY")
         print("="*70)
         
         provider_stats = defaultdict(lambda: {"total_time": 0, "count": 0, "total_words": 0})
+        all_results = {}  # index -> {"prompt": ..., "results": [...]}
         
-        for test in all_results:
-            for result in test['results']:
+        with open(checkpoint_file, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('status') != 'ok':
+                    continue
+                result = record['result']
+                all_results.setdefault(record['index'], {"prompt": record['prompt'], "results": []})["results"].append(result)
                 provider = result['provider']
                 provider_stats[provider]["total_time"] += result['response_time']
                 provider_stats[provider]["count"] += 1
@@ -263,9 +1544,176 @@ class AIComparisonTool:
             print(f"\n{provider}:")
             print(f"  Average response time: {avg_time:.2f}s")
             print(f"  Average words: {avg_words:.1f}")
+            print(f"  Prompts answered: {stats['count']}")
+            
+        print(f"\n💾 Per-prompt results saved to {checkpoint_file}")
+        return [all_results[index] for index in sorted(all_results)]
+        
+    def _load_request(self, request, scheduled, step_stats):
+        """Send one load-test request and record its outcome.
+        
+        Latency is measured from the time the request was scheduled, not from
+        when a worker got around to sending it, so client-side queueing under
+        overload shows up in the numbers instead of being hidden.
+        """
+        try:
+            send_prompt(**request)
+            outcome = "ok"
+        except requests.HTTPError as e:
+            outcome = "rate_limited" if e.response is not None and e.response.status_code == 429 else "error"
+        except Exception:
+            outcome = "error"
+        finished = time.perf_counter()
+        
+        with step_stats['lock']:
+            step_stats[outcome] += 1
+            step_stats['last_finish'] = max(step_stats['last_finish'], finished)
+            if outcome == "ok":
+                step_stats['latency'].record(finished - scheduled)
+                
+    def _run_load_step(self, request, mode, level, duration):
+        """Run one step of a load test and return its statistics"""
+        step_stats = {
+            "lock": threading.Lock(),
+            "latency": LatencyHistogram(),
+            "ok": 0,
+            "error": 0,
+            "rate_limited": 0,
+            "last_finish": 0.0
+        }
+        start = time.perf_counter()
+        
+        if mode == "open":
+            # Open loop: fire at a fixed rate whether or not earlier requests finished
+            interval = 1.0 / level
+            total = max(1, int(duration * level))
+            with ThreadPoolExecutor(max_workers=min(256, total)) as pool:
+                for i in range(total):
+                    scheduled = start + i * interval
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    pool.submit(self._load_request, request, scheduled, step_stats)
+        else:
+            # Closed loop: `level` workers, each sending its next request as soon
+            # as the previous one finishes
+            deadline = start + duration
+            
+            def worker():
+                while time.perf_counter() < deadline:
+                    self._load_request(request, time.perf_counter(), step_stats)
+                    
+            threads = [threading.Thread(target=worker) for _ in range(level)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+                
+        elapsed = max(step_stats['last_finish'], time.perf_counter()) - start
+        attempts = step_stats['ok'] + step_stats['error'] + step_stats['rate_limited']
+        latency = step_stats['latency']
+        
+        return {
+            "offered": level,
+            "requests": attempts,
+            "ok": step_stats['ok'],
+            "errors": step_stats['error'],
+            "rate_limited": step_stats['rate_limited'],
+            "error_rate": step_stats['error'] / attempts if attempts else 0.0,
+            "rate_limited_rate": step_stats['rate_limited'] / attempts if attempts else 0.0,
+            "throughput": step_stats['ok'] / elapsed if elapsed > 0 else 0.0,
+            "p50": latency.quantile(0.5),
+            "p95": latency.quantile(0.95),
+            "p99": latency.quantile(0.99),
+            "mean": latency.mean(),
+            "histogram": latency.to_dict()
+        }
+        
+    def load_test(self, provider_id, prompt, mode="closed", levels=(1, 2, 4, 8, 16), step_duration=10.0, base_url=None):
+        """Ramp up load on one provider and record where it saturates
+        
+        mode="closed" runs `level` concurrent workers per step, mode="open"
+        sends requests at `level` requests/second. Pass base_url to point the
+        test at another endpoint, e.g. MockLLMServer().url for offline runs.
+        Returns a report with latency percentiles, error/429 rates and
+        achieved throughput for every step.
+        """
+        if mode not in ("open", "closed"):
+            raise ValueError("mode must be 'open' or 'closed'")
+            
+        provider = self.providers[provider_id]
+        request = {
+            "provider_id": provider_id,
+            "api_key": provider['api_key'] or "mock-key",
+            "model": provider.get('selected_model') or provider['models'][0],
+            "prompt": prompt,
+            "base_url": base_url or provider.get('base_url')
+        }
+        
+        unit = "QPS" if mode == "open" else "workers"
+        print(f"\n🔥 Load testing {provider['name']} ({mode} loop, {step_duration:.0f}s per step)")
+        print("=" * 70)
+        print(f"{'Load':>10} {'Sent':>6} {'OK':>6} {'429':>6} {'Err':>6} {'QPS':>7} {'p50':>7} {'p95':>7} {'p99':>7}")
+        
+        steps = []
+        for level in levels:
+            step = self._run_load_step(request, mode, level, step_duration)
+            steps.append(step)
+            
+            def fmt(value):
+                return f"{value:.2f}" if value is not None else "-"
+            print(f"{str(level) + ' ' + unit:>10} {step['requests']:>6} {step['ok']:>6} {step['rate_limited']:>6} "
+                  f"{step['errors']:>6} {step['throughput']:>7.2f} {fmt(step['p50']):>7} {fmt(step['p95']):>7} {fmt(step['p99']):>7}")
+                  
+        return {
+            "provider": provider['name'],
+            "model": request['model'],
+            "mode": mode,
+            "step_duration": step_duration,
+            "timestamp": datetime.now().isoformat(),
+            "steps": steps
+        }
+        
+    def export_load_test(self, report, filename=None):
+        """Write a load-test report to JSON"""
+        if not filename:
+            filename = f"loadtest_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
             
-        return all_results
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=2)
+            
+        print(f"\n💾 Load test report saved to {filename}")
+        
+    def interactive_load_test(self):
+        """Ask for load-test settings, run it and offer report/chart output"""
+        provider_ids = list(self.providers)
+        print("\nProviders:")
+        for i, provider_id in enumerate(provider_ids, 1):
+            print(f"  {i}. {self.providers[provider_id]['name']}")
+        provider_id = provider_ids[int(input("Select provider: ")) - 1]
         
+        mode = "open" if input("Mode - (c)losed loop with N workers or (o)pen loop at target QPS? [c/o]: ").lower() == 'o' else "closed"
+        levels = input("Load levels, comma separated (default 1,2,4,8,16): ").strip()
+        levels = [int(level) for level in levels.split(",")] if levels else [1, 2, 4, 8, 16]
+        duration = input("Seconds per step (default 10): ").strip()
+        duration = float(duration) if duration else 10.0
+        prompt = input("Prompt (default 'Say hello'): ").strip() or "Say hello"
+        
+        use_mock = input("Run offline against a local mock endpoint? (y/n): ").lower() == 'y'
+        if not use_mock and not self.providers[provider_id]['enabled']:
+            print("That provider is not configured")
+            return
+            
+        if use_mock:
+            with MockLLMServer() as server:
+                report = self.load_test(provider_id, prompt, mode, levels, duration, base_url=server.url)
+        else:
+            report = self.load_test(provider_id, prompt, mode, levels, duration)
+            
+        self.export_load_test(report)
+        if input("Create chart? (y/n): ").lower() == 'y':
+            self.plot_load_test(report)
+            
     def interactive_comparison(self):
         """Interactive comparison session"""
         print("\n🤖 Multi-Model AI Comparison Tool")
@@ -281,9 +1729,12 @@ class AIComparisonTool:
             print("2. Batch comparison from file")
             print("3. View history")
             print("4. Performance trends")
-            print("5. Exit")
+            print("5. Load test")
+            print("6. Benchmark (repeated runs with significance test)")
+            print("7. Race providers (fastest answer wins)")
+            print("8. Exit")
             
-            choice = input("\nSelect option (1-5): ")
+            choice = input("\nSelect option (1-8): ")
             
             if choice == "1":
                 prompt = input("\nEnter your prompt: ")
@@ -295,7 +1746,9 @@ class AIComparisonTool:
                     action = input("\nAnalyze quality? (y/n): ")
                     if action.lower() == 'y':
                         criteria = input("Quality criteria (e.g., 'accuracy, clarity, creativity'): ")
-                        self.analyze_quality(results, criteria)
+                        reference = input("Reference answer for ROUGE/BLEU (Enter to skip): ").strip() or None
+                        use_judge = input("Also rate with an LLM judge? (y/n): ").lower() == 'y'
+                        self.analyze_quality(results, criteria, reference, use_judge)
                         
                     action = input("Export results? (y/n): ")
                     if action.lower() == 'y':
@@ -307,24 +1760,85 @@ class AIComparisonTool:
                         
             elif choice == "2":
                 filename = input("Enter prompts file name: ")
-                self.batch_comparison(filename)
+                workers = input("Max concurrent requests (default 8): ").strip()
+                self.batch_comparison(filename, max_workers=int(workers) if workers else 8)
                 
             elif choice == "3":
-                if self.results:
+                history = self.store.recent(10)
+                if history:
                     print("\n=== Comparison History ===")
-                    for i, result in enumerate(self.results[-10:], 1):
-                        print(f"{i}. {result['provider']} - {result['response_time']:.2f}s - {result['word_count']} words")
+                    for i, result in enumerate(history, 1):
+                        print(f"{i}. {result['timestamp'][:19]} {result['provider']} ({result['model']}) - "
+                              f"{result['response_time']:.2f}s - {result['word_count']} words")
+                              
+                    action = input("\nExport full history? (csv/parquet/n): ").lower()
+                    if action in ("csv", "parquet"):
+                        filename = f"comparison_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{action}"
+                        try:
+                            export = self.store.export_csv if action == "csv" else self.store.export_parquet
+                            count = export(filename)
+                            print(f"💾 Exported {count} results to {filename}")
+                        except RuntimeError as e:
+                            print(e)
                 else:
                     print("No history yet")
                     
             elif choice == "4":
+                previous = input("Merge metrics from a previous run? (file name or Enter to skip): ").strip()
+                if previous:
+                    self.merge_metrics(previous)
+                    
                 if self.metrics:
-                    print("\n=== Performance Trends ===")
-                    for provider, times in self.metrics.items():
-                        avg_time = sum(times) / len(times)
-                        print(f"{provider}: avg {avg_time:.2f}s over {len(times)} tests")
+                    self.show_performance_trends()
+                    
+                    action = input("\nExport metrics? (y/n): ")
+                    if action.lower() == 'y':
+                        self.export_metrics()
                         
+                self.show_history_trends()
+                
             elif choice == "5":
+                self.interactive_load_test()
+                
+            elif choice == "6":
+                prompt = input("\nEnter your prompt: ")
+                repetitions = input("Timed runs per provider (default 10): ").strip()
+                warmup = input("Warm-up calls per provider (default 1): ").strip()
+                order = input("Provider order - random/interleaved/fixed (default random): ").strip() or "random"
+                benchmark = self.benchmark(
+                    prompt,
+                    repetitions=int(repetitions) if repetitions else 10,
+                    warmup=int(warmup) if warmup else 1,
+                    order=order
+                )
+                if benchmark:
+                    self.display_comparison(benchmark['results'], benchmark)
+                    for c in benchmark['comparisons']:
+                        print(f"{c['faster']} vs {c['slower']}: U={c['u']:.1f}, p={c['p_value']:.4f}")
+                        
+            elif choice == "7":
+                prompt = input("\nEnter your prompt: ")
+                enabled = [pid for pid in self.providers if self.providers[pid]['enabled']]
+                mode = input("Mode - (r)ace all providers or (h)edged primary/backup? [r/h]: ").lower()
+                
+                if mode == 'h' and len(enabled) >= 2:
+                    for i, provider_id in enumerate(enabled, 1):
+                        print(f"  {i}. {self.providers[provider_id]['name']}")
+                    primary = enabled[int(input("Primary provider: ")) - 1]
+                    backup = enabled[int(input("Backup provider: ")) - 1]
+                    print(f"Hedging after {self.hedge_delay(primary):.2f}s")
+                    winner = self.hedged(prompt, primary, backup)
+                else:
+                    winner = self.race(prompt)
+                    
+                if winner:
+                    print(f"\n🏁 {winner['provider']} answered first in {winner['response_time']:.2f}s")
+                    print(winner['response'])
+                else:
+                    print("No provider returned an answer")
+                self.display_race_stats()
+                
+            elif choice == "8":
                 print("Goodbye!")
                 break
 
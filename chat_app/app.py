@@ -1,10 +1,354 @@
 # chat_app.py
-from limma.llm import config, chat, reset_chat
+from limma.llm import config, generate
 import os
+import json
+import time
+import uuid
+import queue
+import shutil
+import textwrap
+import threading
+import statistics
+from collections import deque, OrderedDict
 from datetime import datetime
+import requests
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Streaming chat endpoints, same ones limma.llm uses for blocking calls
+STREAM_ENDPOINTS = {
+    "openai": "https://api.openai.com/v1/chat/completions",
+    "groq": "https://api.groq.com/openai/v1/chat/completions",
+    "mistral": "https://api.mistral.ai/v1/chat/completions",
+    "gemini": "https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent?alt=sse"
+}
+
+
+# Approximate characters per token for each provider's tokenizer
+CHARS_PER_TOKEN = {"openai": 4.0, "gemini": 4.0, "groq": 3.8, "mistral": 3.5}
+
+
+def estimate_tokens(text, provider=None, model=None):
+    """Token count for a provider/model
+    
+    Uses tiktoken for OpenAI models when it is installed, otherwise a
+    characters-per-token estimate for the provider.
+    """
+    if not text:
+        return 0
+    if tiktoken and provider == "openai" and model:
+        try:
+            return len(tiktoken.encoding_for_model(model).encode(text))
+        except KeyError:
+            pass
+    return max(1, round(len(text) / CHARS_PER_TOKEN.get(provider, 4.0)))
+
+
+class ContextWindow:
+    """Conversation history kept within a token budget
+    
+    When the history grows past `budget` tokens, the oldest turns are
+    folded into a rolling summary (via `summarizer`) until it is back under
+    `low_water` of the budget, so summarizing happens in occasional batches
+    rather than on every turn. The prompt sent per turn therefore stays
+    bounded however long the session runs.
+    """
+    
+    # Every message costs a few tokens of role/formatting overhead
+    MESSAGE_OVERHEAD = 4
+    
+    def __init__(self, provider=None, model=None, budget=4000, summary_budget=400, low_water=0.6, summarizer=None):
+        self.provider = provider
+        self.model = model
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.low_water = low_water
+        self.summarizer = summarizer
+        self.turns = deque()
+        self.total_tokens = 0
+        self.summary = ""
+        
+    def count(self, text):
+        return estimate_tokens(text, self.provider, self.model) + self.MESSAGE_OVERHEAD
+        
+    def set_model(self, provider, model):
+        """Recount everything with another provider's tokenizer"""
+        self.provider = provider
+        self.model = model
+        self.turns = deque((m, self.count(m["content"])) for m, _ in self.turns)
+        self.total_tokens = sum(tokens for _, tokens in self.turns)
+        
+    def append(self, role, content):
+        message = {"role": role, "content": content}
+        tokens = self.count(content)
+        self.turns.append((message, tokens))
+        self.total_tokens += tokens
+        
+    def pop(self):
+        message, tokens = self.turns.pop()
+        self.total_tokens -= tokens
+        return message
+        
+    def clear(self):
+        self.turns.clear()
+        self.total_tokens = 0
+        self.summary = ""
+        
+    def __len__(self):
+        return len(self.turns)
+        
+    def _fallback_summary(self, evicted):
+        """Cheap extractive summary: the first sentence of each evicted message"""
+        lines = [self.summary] if self.summary else []
+        for message in evicted:
+            first_sentence = message["content"].split(". ")[0].strip()
+            lines.append(f"{message['role']}: {first_sentence[:200]}")
+        return "\n".join(lines)
+        
+    def _trim_summary(self, summary):
+        # Keep the most recent part if the summary itself outgrows its budget
+        max_chars = int(self.summary_budget * CHARS_PER_TOKEN.get(self.provider, 4.0))
+        return summary[-max_chars:] if len(summary) > max_chars else summary
+        
+    def enforce_budget(self):
+        """Fold the oldest turns into the summary if the history is over budget"""
+        if self.total_tokens <= self.budget:
+            return
+            
+        target = self.budget * self.low_water
+        evicted = []
+        # Always keep the latest message (the turn being answered)
+        while self.total_tokens > target and len(self.turns) > 1:
+            message, tokens = self.turns.popleft()
+            self.total_tokens -= tokens
+            evicted.append(message)
+            
+        summary = None
+        if self.summarizer:
+            try:
+                summary = self.summarizer(self.summary, evicted)
+            except Exception:
+                summary = None
+        self.summary = self._trim_summary(summary or self._fallback_summary(evicted))
+        
+    def messages(self):
+        """Messages to send for the next request, within the budget"""
+        self.enforce_budget()
+        messages = [message for message, _ in self.turns]
+        if self.summary:
+            messages.insert(0, {
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{self.summary}"
+            })
+        return messages
+
+
+def build_stream_request(provider, api_key, model, messages, base_url=None):
+    """Return (url, headers, payload) for a streaming chat request"""
+    if provider == "gemini":
+        url = base_url or STREAM_ENDPOINTS["gemini"].format(model=model)
+        headers = {"x-goog-api-key": api_key, "Content-Type": "application/json"}
+        payload = {"contents": [
+            {"role": "model" if m["role"] == "assistant" else "user", "parts": [{"text": m["content"]}]}
+            for m in messages
+        ]}
+    else:
+        url = base_url or STREAM_ENDPOINTS[provider]
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        payload = {"model": model, "messages": messages, "stream": True}
+    return url, headers, payload
+
+
+def parse_stream_line(provider, line):
+    """Text carried by one server-sent event line, "" if none, or None at the end"""
+    if not line or not line.startswith("data:"):
+        return ""
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return None
+        
+    event = json.loads(data)
+    try:
+        if provider == "gemini":
+            return event["candidates"][0]["content"]["parts"][0].get("text", "")
+        return event["choices"][0]["delta"].get("content") or ""
+    except (KeyError, IndexError):
+        return ""
+
+
+def stream_chat(provider, api_key, model, messages, base_url=None, timeout=60):
+    """Yield reply text chunks as the provider emits them"""
+    url, headers, payload = build_stream_request(provider, api_key, model, messages, base_url)
+    
+    with requests.post(url, headers=headers, json=payload, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        
+        # chunk_size=None hands each server-sent event over as soon as it arrives
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            text = parse_stream_line(provider, line)
+            if text is None:
+                break
+            if text:
+                yield text
+
+
+class TranscriptStore:
+    """Append-only chat transcripts with snapshots for fast resume
+    
+    Every message is appended to `<session>.log.jsonl`. Appends are flushed
+    right away but fsync'ed in batches (every `fsync_every` records or
+    `fsync_interval` seconds). A snapshot of the session's context plus the
+    log offset it covers lets a session resume by reading the snapshot and
+    only the log records written after it. `index.json` maps session ids to
+    their metadata so sessions can be listed and opened without scanning
+    files.
+    """
+    
+    def __init__(self, base_dir="chat_transcripts", fsync_every=8, fsync_interval=1.0, max_open_files=32):
+        self.base_dir = base_dir
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.max_open_files = max_open_files
+        os.makedirs(base_dir, exist_ok=True)
+        
+        self._files = OrderedDict()  # session_id -> [file, unsynced records, last fsync time]
+        self.index_file = os.path.join(base_dir, "index.json")
+        self.index = {}
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'r') as f:
+                self.index = json.load(f)
+                
+    def _log_path(self, session_id):
+        return os.path.join(self.base_dir, f"{session_id}.log.jsonl")
+        
+    def _snapshot_path(self, session_id):
+        return os.path.join(self.base_dir, f"{session_id}.snapshot.json")
+        
+    def _atomic_write(self, path, data):
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        
+    def _save_index(self):
+        self._atomic_write(self.index_file, self.index)
+        
+    def _open(self, session_id):
+        if session_id in self._files:
+            self._files.move_to_end(session_id)
+            return self._files[session_id]
+            
+        path = self._log_path(session_id)
+        # Binary mode so tell() gives real byte offsets for snapshots
+        f = open(path, 'ab')
+        # A crash can leave a half-written last line; start on a fresh line
+        if f.tell() > 0:
+            with open(path, 'rb') as check:
+                check.seek(-1, os.SEEK_END)
+                if check.read(1) != b"\n":
+                    f.write(b"\n")
+        entry = [f, 0, time.monotonic()]
+        self._files[session_id] = entry
+        
+        # Keep the number of open log files bounded
+        while len(self._files) > self.max_open_files:
+            _, (old_file, unsynced, _) = self._files.popitem(last=False)
+            if unsynced:
+                os.fsync(old_file.fileno())
+            old_file.close()
+        return entry
+        
+    def create_session(self, title=None):
+        session_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        self.index[session_id] = {"title": title or now[:16], "created": now, "updated": now, "messages": 0}
+        self._save_index()
+        return session_id
+        
+    def append(self, session_id, role, content):
+        """Append one message to a session's log"""
+        entry = self._open(session_id)
+        f = entry[0]
+        record = {"role": role, "content": content, "timestamp": datetime.now().isoformat()}
+        f.write((json.dumps(record) + "\n").encode('utf-8'))
+        f.flush()
+        entry[1] += 1
+        
+        if entry[1] >= self.fsync_every or time.monotonic() - entry[2] >= self.fsync_interval:
+            os.fsync(f.fileno())
+            entry[1] = 0
+            entry[2] = time.monotonic()
+            
+        meta = self.index.setdefault(session_id, {"title": session_id[:8], "created": datetime.now().isoformat(), "messages": 0})
+        meta["messages"] += 1
+        meta["updated"] = datetime.now().isoformat()
+        if meta["messages"] == 1 and role == "user":
+            meta["title"] = content[:60]
+            
+    def snapshot(self, session_id, state):
+        """Save the session's current state together with the log offset it covers"""
+        entry = self._open(session_id)
+        f = entry[0]
+        f.flush()
+        os.fsync(f.fileno())
+        entry[1] = 0
+        entry[2] = time.monotonic()
+        
+        self._atomic_write(self._snapshot_path(session_id), {"log_offset": f.tell(), "state": state})
+        self._save_index()
+        
+    def load(self, session_id):
+        """Return (state from the last snapshot or None, messages logged after it)"""
+        if session_id not in self.index:
+            raise KeyError(session_id)
+            
+        state, offset = None, 0
+        if os.path.exists(self._snapshot_path(session_id)):
+            with open(self._snapshot_path(session_id), 'r') as f:
+                snapshot = json.load(f)
+            state, offset = snapshot["state"], snapshot["log_offset"]
+            
+        messages = []
+        if os.path.exists(self._log_path(session_id)):
+            with open(self._log_path(session_id), 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    try:
+                        messages.append(json.loads(line))
+                    except ValueError:
+                        continue
+        return state, messages
+        
+    def read_all(self, session_id):
+        """Every message ever logged for a session"""
+        with open(self._log_path(session_id), 'rb') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+                    
+    def list_sessions(self):
+        """Sessions from the index, most recently updated first"""
+        return sorted(self.index.items(), key=lambda item: item[1]["updated"], reverse=True)
+        
+    def close(self):
+        for f, unsynced, _ in self._files.values():
+            if unsynced:
+                f.flush()
+                os.fsync(f.fileno())
+            f.close()
+        self._files.clear()
+        self._save_index()
+
 
 class LLMChatApp:
-    def __init__(self):
+    def __init__(self, context_budget=4000, transcripts_dir="chat_transcripts", snapshot_every=10):
         self.providers = {
             "1": {"name": "OpenAI", "models": ["gpt-5", "gpt-3.5-turbo"]},
             "2": {"name": "Gemini", "models": ["gemini-2.5-flash", "gemini-3-flash-preview"]},
@@ -13,6 +357,32 @@ class LLMChatApp:
         }
         self.current_provider = None
         self.current_model = None
+        self.api_key = None
+        self.base_url = None
+        
+        # Conversation kept here (not in limma's global chat state) so it can
+        # be streamed, survives interrupted replies and stays within a token
+        # budget
+        self.context = ContextWindow(budget=context_budget, summarizer=self.summarize)
+        self.streaming = True
+        # Providers whose streaming endpoint failed; they use blocking calls
+        self.no_streaming = set()
+        self.turn_stats = []
+        
+        # Every turn is appended to a transcript log; a snapshot of the
+        # context is taken every `snapshot_every` turns for fast resume
+        self.transcripts = TranscriptStore(transcripts_dir)
+        self.session_id = None
+        self.snapshot_every = snapshot_every
+        self._turns_since_snapshot = 0
+        
+        # "Ask all providers" mode: provider -> settings, its own context and
+        # latency/failure stats
+        self.panel = {}
+        self.panel_mode = False
+        self.last_round = None
+        self.drop_after_failures = 3
+        self.drop_slower_than = 3.0  # times the fastest provider's median
         
     def setup_provider(self):
         """Interactive provider setup"""
@@ -40,11 +410,367 @@ class LLMChatApp:
                 api_key=api_key,
                 model=self.current_model
             )
+            if self.session_id:
+                # Snapshot before switching so the session resumes instantly
+                self.snapshot()
             self.current_provider = provider_name
+            self.api_key = api_key
+            self.context.set_model(provider_name, self.current_model)
             print(f"\n✅ Configured {self.providers[choice]['name']} with {self.current_model}")
         else:
             print("Invalid choice!")
             
+    def new_session(self):
+        """Start a new conversation with its own transcript"""
+        if self.session_id:
+            self.snapshot()
+        self.context.clear()
+        self.session_id = self.transcripts.create_session()
+        self._turns_since_snapshot = 0
+        
+    def snapshot(self):
+        """Save the current context so the session can resume without replaying its log"""
+        self.transcripts.snapshot(self.session_id, {
+            "summary": self.context.summary,
+            "messages": [message for message, _ in self.context.turns],
+            "provider": self.current_provider,
+            "model": self.current_model
+        })
+        self._turns_since_snapshot = 0
+        
+    def resume_session(self, session_id):
+        """Load a session from its last snapshot plus the messages logged after it"""
+        if self.session_id and self.session_id != session_id:
+            self.snapshot()
+        state, messages = self.transcripts.load(session_id)
+        
+        self.context.clear()
+        if state:
+            self.context.summary = state["summary"]
+            for message in state["messages"]:
+                self.context.append(message["role"], message["content"])
+        for message in messages:
+            self.context.append(message["role"], message["content"])
+            
+        self.session_id = session_id
+        self._turns_since_snapshot = len(messages) // 2
+        
+    def _record_turn(self, user_input, response):
+        """Append a finished turn to the transcript"""
+        if not self.session_id:
+            self.session_id = self.transcripts.create_session()
+        self.transcripts.append(self.session_id, "user", user_input)
+        self.transcripts.append(self.session_id, "assistant", response)
+        
+        self._turns_since_snapshot += 1
+        if self._turns_since_snapshot >= self.snapshot_every:
+            self.snapshot()
+            
+    def setup_panel(self):
+        """Pick the providers that answer every turn in "ask all" mode"""
+        print("\n=== Ask All Providers ===")
+        self.panel = {}
+        for provider in self.providers.values():
+            provider_id = provider["name"].lower()
+            if input(f"Include {provider['name']}? (y/n): ").lower() != 'y':
+                continue
+            for i, model in enumerate(provider["models"], 1):
+                print(f"  {i}. {model}")
+            model = provider["models"][int(input("Select model: ")) - 1]
+            if provider_id == self.current_provider:
+                api_key = self.api_key
+            else:
+                api_key = input(f"Enter your {provider['name']} API key: ")
+            self.add_panel_member(provider_id, model, api_key)
+            
+        self.panel_mode = bool(self.panel)
+        if self.panel_mode:
+            print(f"\n✅ Asking {len(self.panel)} providers every turn. Type 'promote <number>' to keep an answer.")
+            
+    def add_panel_member(self, provider_id, model, api_key, base_url=None):
+        """Add a provider to "ask all" mode with its own isolated history"""
+        context = ContextWindow(provider_id, model, self.context.budget)
+        # Start from the canonical conversation so far
+        context.summary = self.context.summary
+        for message, _ in self.context.turns:
+            context.append(message["role"], message["content"])
+        self.panel[provider_id] = {
+            "model": model,
+            "api_key": api_key,
+            "base_url": base_url,
+            "context": context,
+            "latencies": deque(maxlen=20),
+            "failures": 0,
+            "consecutive_failures": 0,
+            "active": True
+        }
+        
+    def _render_columns(self, answers, order):
+        """Print the answers next to each other, one column per provider"""
+        width = shutil.get_terminal_size((120, 20)).columns
+        column_width = max(20, width // len(order) - 3)
+        columns = [
+            [f"{i}. {pid}"[:column_width], "-" * column_width]
+            + textwrap.wrap(answers.get(pid) or "(no answer)", column_width)
+            for i, pid in enumerate(order, 1)
+        ]
+        for row in range(max(len(column) for column in columns)):
+            print(" | ".join(
+                (column[row] if row < len(column) else "").ljust(column_width)
+                for column in columns
+            ))
+            
+    def ask_all(self, user_input):
+        """Send one turn to every active provider at once and stream the replies
+        
+        Chunks are printed as they arrive, tagged with their provider, and a
+        side-by-side view follows once all providers are done. Ctrl-C stops
+        waiting for the rest. Returns the answers of this round.
+        """
+        members = [pid for pid, member in self.panel.items() if member["active"]]
+        events = queue.Queue()
+        cancel = threading.Event()
+        
+        def worker(pid, member, messages):
+            chunks = []
+            ttft = None
+            start_time = time.perf_counter()
+            stream = stream_chat(pid, member["api_key"], member["model"], messages, member["base_url"])
+            try:
+                for chunk in stream:
+                    if cancel.is_set():
+                        break
+                    if ttft is None:
+                        ttft = time.perf_counter() - start_time
+                    chunks.append(chunk)
+                    events.put((pid, "chunk", chunk))
+                events.put((pid, "done", {"text": "".join(chunks), "ttft": ttft,
+                                           "total_time": time.perf_counter() - start_time}))
+            except Exception as e:
+                events.put((pid, "error", {"text": "".join(chunks), "error": str(e)}))
+            finally:
+                stream.close()
+                
+        for pid in members:
+            member = self.panel[pid]
+            member["context"].append("user", user_input)
+            threading.Thread(
+                target=worker,
+                args=(pid, member, member["context"].messages()),
+                daemon=True
+            ).start()
+            
+        answers = {}
+        outcomes = {}
+        speaker = None
+        remaining = set(members)
+        try:
+            while remaining:
+                pid, kind, data = events.get()
+                if kind == "chunk":
+                    if pid != speaker:
+                        print(f"\n[{pid}] ", end="")
+                        speaker = pid
+                    print(data, end="", flush=True)
+                    continue
+                remaining.discard(pid)
+                outcomes[pid] = (kind, data)
+        except KeyboardInterrupt:
+            cancel.set()
+            print(" [stopped]")
+        print()
+        
+        for pid in members:
+            member = self.panel[pid]
+            kind, data = outcomes.get(pid, ("cancelled", {"text": ""}))
+            text = data["text"]
+            if text:
+                member["context"].append("assistant", text)
+                answers[pid] = text
+            else:
+                member["context"].pop()
+                
+            if kind == "done" and text:
+                member["latencies"].append(data["total_time"])
+                member["consecutive_failures"] = 0
+            elif kind == "error":
+                member["failures"] += 1
+                member["consecutive_failures"] += 1
+                print(f"⚠️  {pid} failed: {data['error']}")
+                
+        if answers:
+            print()
+            self._render_columns(answers, members)
+            for pid in members:
+                latencies = self.panel[pid]["latencies"]
+                if pid in answers and latencies:
+                    print(f"   {pid}: {latencies[-1]:.2f}s (median {statistics.median(latencies):.2f}s over {len(latencies)} turns)")
+                    
+        self.last_round = {"user": user_input, "order": members, "answers": answers}
+        self._drop_slow_providers()
+        return answers
+        
+    def _drop_slow_providers(self):
+        """Stop asking providers that keep failing or are far slower than the best one"""
+        active = {pid: m for pid, m in self.panel.items() if m["active"]}
+        medians = {
+            pid: statistics.median(m["latencies"])
+            for pid, m in active.items() if len(m["latencies"]) >= 3
+        }
+        fastest = min(medians.values()) if medians else None
+        
+        for pid, member in active.items():
+            reason = None
+            if member["consecutive_failures"] >= self.drop_after_failures:
+                reason = f"{member['consecutive_failures']} failures in a row"
+            elif fastest and pid in medians and medians[pid] > fastest * self.drop_slower_than:
+                reason = f"median {medians[pid]:.2f}s vs fastest {fastest:.2f}s"
+            # Always keep at least one provider
+            if reason and sum(m["active"] for m in self.panel.values()) > 1:
+                member["active"] = False
+                print(f"🚫 Dropping {pid}: {reason}")
+                
+    def promote(self, number):
+        """Make one provider's last answer the canonical reply for every provider"""
+        if not self.last_round or not self.last_round["answers"]:
+            print("Nothing to promote yet")
+            return
+        pid = self.last_round["order"][number - 1]
+        answer = self.last_round["answers"].get(pid)
+        if not answer:
+            print(f"{pid} has no answer to promote")
+            return
+            
+        user_input = self.last_round["user"]
+        for other_pid, member in self.panel.items():
+            context = member["context"]
+            if other_pid in self.last_round["answers"]:
+                context.pop()
+            elif not context.turns or context.turns[-1][0]["content"] != user_input:
+                # This provider didn't answer: give it the turn as well
+                context.append("user", user_input)
+            context.append("assistant", answer)
+            
+        self.context.append("user", user_input)
+        self.context.append("assistant", answer)
+        self._record_turn(user_input, answer)
+        self.last_round["answers"] = {}
+        print(f"✅ {pid}'s answer is now part of every provider's history")
+        
+    def summarize(self, previous_summary, messages):
+        """Fold old messages into the rolling conversation summary"""
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = f"""Update the summary of a conversation with the messages below.
+Keep names, facts, decisions and open questions. Reply with the summary only, at most 150 words.
+
+Current summary:
+{previous_summary or "(none)"}
+
+New messages:
+{transcript}"""
+        return generate(prompt)
+        
+    def chat(self, user_input):
+        """Blocking chat turn; used when the provider can't stream"""
+        self.context.append("user", user_input)
+        start_time = time.perf_counter()
+        try:
+            response = generate(self.context.messages())
+        except Exception:
+            self.context.pop()
+            raise
+        self.context.append("assistant", response)
+        self._record_turn(user_input, response)
+        
+        total_time = time.perf_counter() - start_time
+        tokens = estimate_tokens(response, self.current_provider, self.current_model)
+        self.turn_stats.append({
+            "ttft": total_time,
+            "total_time": total_time,
+            "tokens": tokens,
+            "tokens_per_sec": tokens / total_time if total_time > 0 else None,
+            "streamed": False,
+            "interrupted": False,
+            "context_tokens": self.context.total_tokens
+        })
+        return response
+        
+    def stream_reply(self, user_input):
+        """Stream the reply to stdout token by token
+        
+        Ctrl-C stops the reply but keeps the session: whatever arrived so far
+        is kept in the history. Falls back to a blocking call if the provider
+        can't stream. Returns the stats recorded for this turn.
+        """
+        if not self.streaming or self.current_provider in self.no_streaming:
+            print(self.chat(user_input))
+            return self.turn_stats[-1]
+            
+        self.context.append("user", user_input)
+        chunks = []
+        ttft = None
+        interrupted = False
+        start_time = time.perf_counter()
+        stream = stream_chat(
+            self.current_provider,
+            self.api_key,
+            self.current_model,
+            self.context.messages(),
+            self.base_url
+        )
+        
+        try:
+            for chunk in stream:
+                if ttft is None:
+                    ttft = time.perf_counter() - start_time
+                chunks.append(chunk)
+                print(chunk, end="", flush=True)
+        except KeyboardInterrupt:
+            interrupted = True
+            print(" [interrupted]", end="")
+        except Exception as e:
+            unsupported = (
+                isinstance(e, requests.HTTPError)
+                and e.response is not None
+                and e.response.status_code in (400, 404, 405, 415, 501)
+            )
+            if chunks or not unsupported:
+                self.context.pop()
+                raise
+            # The endpoint rejected the streaming request: remember that this
+            # provider can't stream and answer with a blocking call instead
+            self.no_streaming.add(self.current_provider)
+            self.context.pop()
+            print(f"(streaming unavailable: {e})")
+            print(self.chat(user_input))
+            return self.turn_stats[-1]
+        finally:
+            stream.close()
+        print()
+        
+        total_time = time.perf_counter() - start_time
+        response = "".join(chunks)
+        if response:
+            self.context.append("assistant", response)
+            self._record_turn(user_input, response)
+        else:
+            # Interrupted before any text arrived: drop the unanswered turn
+            self.context.pop()
+            
+        tokens = estimate_tokens(response, self.current_provider, self.current_model)
+        generation_time = total_time - ttft if ttft is not None else total_time
+        stats = {
+            "ttft": ttft,
+            "total_time": total_time,
+            "tokens": tokens,
+            "tokens_per_sec": tokens / generation_time if tokens and generation_time > 0 else None,
+            "streamed": True,
+            "interrupted": interrupted,
+            "context_tokens": self.context.total_tokens
+        }
+        self.turn_stats.append(stats)
+        return stats
+        
     def chat_loop(self):
         """Main chat interaction loop"""
         if not self.current_provider:
@@ -53,27 +779,70 @@ class LLMChatApp:
             
         print(f"\n=== Chat Session Started (Provider: {self.current_provider}, Model: {self.current_model}) ===")
         print("Type 'exit' to quit, 'switch' to change provider, 'new' to start new conversation")
+        print("Type 'sessions' to list saved conversations, 'resume <number>' to continue one, 'save' to export")
+        print("Type 'all' to ask several providers at once, 'single' to go back to one")
+        print("Press Ctrl+C while a reply is streaming to stop it")
         print("-" * 50)
         
+        if not self.session_id:
+            self.new_session()
+            
         while True:
             user_input = input("\nYou: ").strip()
             
             if user_input.lower() == 'exit':
+                self.snapshot()
+                self.transcripts.close()
                 print("Goodbye!")
                 break
+            elif user_input.lower() == 'sessions':
+                sessions = self.transcripts.list_sessions()[:20]
+                for i, (session_id, meta) in enumerate(sessions, 1):
+                    marker = " (current)" if session_id == self.session_id else ""
+                    print(f"{i}. {meta['updated'][:16]}  {meta['title']} [{meta['messages']} messages]{marker}")
+                continue
+            elif user_input.lower().startswith('resume'):
+                try:
+                    number = int(user_input.split()[1])
+                    session_id = self.transcripts.list_sessions()[number - 1][0]
+                    self.resume_session(session_id)
+                    print(f"Resumed conversation with {len(self.context)} messages in context")
+                except (IndexError, ValueError, KeyError):
+                    print("Usage: resume <number from 'sessions'>")
+                continue
+            elif user_input.lower() == 'save':
+                self.save_conversation()
+                continue
+            elif user_input.lower() == 'all':
+                self.setup_panel()
+                continue
+            elif user_input.lower() == 'single':
+                self.panel_mode = False
+                print(f"Back to {self.current_provider} only")
+                continue
+            elif user_input.lower().startswith('promote'):
+                try:
+                    self.promote(int(user_input.split()[1]))
+                except (IndexError, ValueError):
+                    print("Usage: promote <column number>")
+                continue
             elif user_input.lower() == 'switch':
                 self.setup_provider()
                 continue
             elif user_input.lower() == 'new':
-                reset_chat()
+                self.new_session()
                 print("Started new conversation!")
                 continue
                 
-            if user_input:
+            if user_input and self.panel_mode:
+                self.ask_all(user_input)
+            elif user_input:
                 try:
                     print("AI: ", end="", flush=True)
-                    response = chat(user_input)
-                    print(response)
+                    stats = self.stream_reply(user_input)
+                    if stats['ttft'] is not None and stats['tokens_per_sec']:
+                        print(f"   ⏱️  first token {stats['ttft']:.2f}s · {stats['tokens_per_sec']:.1f} tokens/s"
+                              f" · context {stats['context_tokens']} tokens")
                 except Exception as e:
                     print(f"Error: {e}")
                     
@@ -81,7 +850,16 @@ class LLMChatApp:
         """Save chat history to file"""
         if not filename:
             filename = f"chat_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-        # Note: You'd need to capture chat history to implement this
+        if not self.session_id:
+            print("Nothing to save yet")
+            return
+            
+        # Make sure everything logged so far is on disk before reading it back
+        self.snapshot()
+        with open(filename, 'w') as f:
+            for message in self.transcripts.read_all(self.session_id):
+                speaker = "You" if message["role"] == "user" else "AI"
+                f.write(f"[{message['timestamp'][:19]}] {speaker}: {message['content']}\n\n")
         print(f"Conversation saved to {filename}")
 
 def main():
@@ -0,0 +1,415 @@
+# server.py
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+import aiohttp
+from aiohttp import web
+from app import STREAM_ENDPOINTS, ContextWindow, build_stream_request, parse_stream_line, estimate_tokens
+
+API_KEY_ENV = {
+    "openai": "OPENAI_API_KEY",
+    "gemini": "GEMINI_API_KEY",
+    "groq": "GROQ_API_KEY",
+    "mistral": "MISTRAL_API_KEY"
+}
+
+SESSION_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+async def fake_stream(messages, delay=0.01):
+    """Local stand-in provider for tests: echoes the last message word by word"""
+    reply = f"You said: {messages[-1]['content']}"
+    for word in reply.split():
+        await asyncio.sleep(delay)
+        yield word + " "
+
+
+async def astream_chat(http, provider, api_key, model, messages, base_url=None):
+    """Async version of app.stream_chat; yields reply text as it arrives"""
+    if provider == "fake":
+        async for text in fake_stream(messages):
+            yield text
+        return
+    
+    url, headers, payload = build_stream_request(provider, api_key, model, messages, base_url)
+    async with http.post(url, headers=headers, json=payload) as response:
+        response.raise_for_status()
+        async for raw_line in response.content:
+            text = parse_stream_line(provider, raw_line.decode('utf-8').strip())
+            if text is None:
+                break
+            if text:
+                yield text
+
+
+class SessionBusy(Exception):
+    """Raised when a session already has too many turns waiting"""
+
+
+class ChatSession:
+    """One user's conversation and provider settings"""
+    
+    def __init__(self, session_id, provider, model, base_url=None, budget=4000):
+        self.session_id = session_id
+        self.provider = provider
+        self.model = model
+        self.base_url = base_url
+        self.context = ContextWindow(provider, model, budget)
+        self.lock = asyncio.Lock()
+        self.pending = 0
+        self.turns = 0
+        self.last_stats = None
+        self.last_active = time.monotonic()
+    
+    def to_dict(self):
+        return {
+            "session_id": self.session_id,
+            "provider": self.provider,
+            "model": self.model,
+            "base_url": self.base_url,
+            "budget": self.context.budget,
+            "summary": self.context.summary,
+            "messages": [message for message, _ in self.context.turns],
+            "turns": self.turns,
+            "last_stats": self.last_stats
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        session = cls(data["session_id"], data["provider"], data["model"], data["base_url"], data["budget"])
+        session.context.summary = data["summary"]
+        for message in data["messages"]:
+            session.context.append(message["role"], message["content"])
+        session.turns = data["turns"]
+        session.last_stats = data["last_stats"]
+        return session
+    
+    def info(self):
+        return {
+            "session_id": self.session_id,
+            "provider": self.provider,
+            "model": self.model,
+            "turns": self.turns,
+            "context_tokens": self.context.total_tokens,
+            "last_stats": self.last_stats
+        }
+
+
+class ChatServer:
+    """Hosts many independent chat sessions in one asyncio process
+    
+    Every session has its own history (a ContextWindow) and provider
+    settings. A session accepts at most `max_pending` turns at once and
+    answers 429 beyond that, sessions idle for `idle_timeout` seconds are
+    written to `sessions_dir` and dropped from memory, and replies are
+    streamed over chunked HTTP or a WebSocket.
+    """
+    
+    def __init__(self, sessions_dir="chat_sessions", idle_timeout=300, max_pending=2, max_upstream=256, budget=4000):
+        self.sessions_dir = sessions_dir
+        self.idle_timeout = idle_timeout
+        self.max_pending = max_pending
+        self.budget = budget
+        self.sessions = {}
+        # API keys stay in memory (never on disk), also for evicted sessions
+        self.api_keys = {}
+        self._upstream = asyncio.Semaphore(max_upstream)
+        self._http = None
+        self._evictor = None
+        os.makedirs(sessions_dir, exist_ok=True)
+    
+    def _session_path(self, session_id):
+        return os.path.join(self.sessions_dir, f"{session_id}.json")
+    
+    def _write_session(self, data):
+        path = self._session_path(data["session_id"])
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+    
+    def _read_session(self, session_id):
+        with open(self._session_path(session_id), 'r') as f:
+            return json.load(f)
+    
+    async def get_session(self, session_id):
+        """Return a hot session, loading it back from disk if it was evicted"""
+        if not SESSION_ID_RE.match(session_id):
+            raise KeyError(session_id)
+        session = self.sessions.get(session_id)
+        if session:
+            # Counts as activity, so evict_idle can't drop it before the turn starts
+            session.last_active = time.monotonic()
+            return session
+        
+        if not os.path.exists(self._session_path(session_id)):
+            raise KeyError(session_id)
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, self._read_session, session_id)
+        # Another request may have loaded it while we were reading
+        session = self.sessions.setdefault(session_id, ChatSession.from_dict(data))
+        session.last_active = time.monotonic()
+        return session
+    
+    def create_session(self, provider, model, api_key=None, base_url=None, budget=None):
+        if provider != "fake" and provider not in STREAM_ENDPOINTS:
+            raise ValueError(f"Unknown provider: {provider}")
+        if base_url and not api_key and provider != "fake":
+            # Never send the server's own key to an endpoint the client picked
+            raise ValueError("A custom base_url needs its own api_key")
+        
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = ChatSession(session_id, provider, model, base_url, budget or self.budget)
+        if api_key:
+            self.api_keys[session_id] = api_key
+        return self.sessions[session_id]
+    
+    def _api_key(self, session):
+        """The key the client sent, else the server's key for the provider
+        
+        Client keys only live in memory, so after a restart a session with a
+        custom base_url gets no key rather than the server's.
+        """
+        if session.session_id in self.api_keys:
+            return self.api_keys[session.session_id]
+        if session.base_url:
+            return ""
+        return os.getenv(API_KEY_ENV.get(session.provider, ""), "")
+    
+    async def delete_session(self, session_id):
+        session = await self.get_session(session_id)
+        self.sessions.pop(session.session_id, None)
+        self.api_keys.pop(session.session_id, None)
+        if os.path.exists(self._session_path(session.session_id)):
+            os.remove(self._session_path(session.session_id))
+    
+    async def evict_idle(self):
+        """Write idle sessions to disk and drop them from memory"""
+        now = time.monotonic()
+        idle = [
+            session for session in self.sessions.values()
+            if now - session.last_active > self.idle_timeout and not session.pending
+        ]
+        loop = asyncio.get_running_loop()
+        for session in idle:
+            await loop.run_in_executor(None, self._write_session, session.to_dict())
+            # Skip it if a new turn started while we were writing
+            if not session.pending and now - session.last_active > self.idle_timeout:
+                self.sessions.pop(session.session_id, None)
+        return len(idle)
+    
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_timeout / 4))
+            await self.evict_idle()
+    
+    async def reply(self, session, message):
+        """Answer one user turn, yielding reply text as it streams in
+        
+        Turns of the same session run one after another; if more than
+        max_pending are already waiting, SessionBusy is raised.
+        """
+        if session.pending >= self.max_pending:
+            raise SessionBusy(session.session_id)
+        
+        session.pending += 1
+        try:
+            async with session.lock:
+                session.context.append("user", message)
+                chunks = []
+                ttft = None
+                start_time = time.perf_counter()
+                try:
+                    async with self._upstream:
+                        async for text in astream_chat(
+                            self._http,
+                            session.provider,
+                            self._api_key(session),
+                            session.model,
+                            session.context.messages(),
+                            session.base_url
+                        ):
+                            if ttft is None:
+                                ttft = time.perf_counter() - start_time
+                            chunks.append(text)
+                            yield text
+                except BaseException:
+                    # Keep a partial answer if the client went away mid-reply,
+                    # otherwise forget the unanswered turn
+                    if chunks:
+                        session.context.append("assistant", "".join(chunks))
+                    else:
+                        session.context.pop()
+                    raise
+                
+                response = "".join(chunks)
+                session.context.append("assistant", response)
+                session.turns += 1
+                
+                total_time = time.perf_counter() - start_time
+                tokens = estimate_tokens(response, session.provider, session.model)
+                generation_time = total_time - ttft if ttft is not None else total_time
+                session.last_stats = {
+                    "ttft": ttft,
+                    "total_time": total_time,
+                    "tokens": tokens,
+                    "tokens_per_sec": tokens / generation_time if tokens and generation_time > 0 else None,
+                    "context_tokens": session.context.total_tokens
+                }
+        finally:
+            session.pending -= 1
+            session.last_active = time.monotonic()
+    
+    # --- HTTP handlers ---
+    
+    async def _session_or_404(self, request):
+        try:
+            return await self.get_session(request.match_info["session_id"])
+        except KeyError:
+            raise web.HTTPNotFound(text=json.dumps({"error": "Unknown session"}), content_type="application/json")
+    
+    async def handle_create(self, request):
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.json_response({"error": "Body must be JSON"}, status=400)
+        if not isinstance(data, dict):
+            return web.json_response({"error": "Body must be a JSON object"}, status=400)
+        budget = data.get("budget")
+        if budget is not None and (not isinstance(budget, int) or isinstance(budget, bool) or budget <= 0):
+            return web.json_response({"error": "budget must be a positive integer"}, status=400)
+        try:
+            session = self.create_session(
+                data.get("provider", "fake"),
+                data.get("model", ""),
+                data.get("api_key"),
+                data.get("base_url"),
+                budget
+            )
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        return web.json_response(session.info(), status=201)
+    
+    async def handle_info(self, request):
+        session = await self._session_or_404(request)
+        return web.json_response(session.info())
+    
+    async def handle_delete(self, request):
+        try:
+            await self.delete_session(request.match_info["session_id"])
+        except KeyError:
+            return web.json_response({"error": "Unknown session"}, status=404)
+        return web.json_response({"deleted": True})
+    
+    async def handle_message(self, request):
+        """POST a message, get the reply back as a chunked text stream"""
+        session = await self._session_or_404(request)
+        message = (await request.json()).get("message", "").strip()
+        if not message:
+            return web.json_response({"error": "Empty message"}, status=400)
+        if session.pending >= self.max_pending:
+            return web.json_response({"error": "Session busy, retry later"}, status=429)
+        
+        response = web.StreamResponse(headers={"Content-Type": "text/plain; charset=utf-8"})
+        await response.prepare(request)
+        replies = self.reply(session, message)
+        try:
+            # write() waits for the socket to drain, so a slow reader slows
+            # down this session's stream instead of buffering it in memory
+            async for text in replies:
+                await response.write(text.encode('utf-8'))
+        except SessionBusy:
+            await response.write(b"[busy]")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            await response.write(f"\n[error: {e}]".encode('utf-8'))
+        finally:
+            await replies.aclose()
+        await response.write_eof()
+        return response
+    
+    async def handle_websocket(self, request):
+        """Stream replies over a WebSocket: send {"message": ...}, get token events back"""
+        session_id = (await self._session_or_404(request)).session_id
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        
+        async for ws_message in ws:
+            if ws_message.type != aiohttp.WSMsgType.TEXT:
+                continue
+            try:
+                message = json.loads(ws_message.data).get("message", "").strip()
+            except ValueError:
+                message = ws_message.data.strip()
+            if not message:
+                continue
+            
+            # Look the session up per message: the socket can outlive
+            # idle_timeout, and an evicted session must be reloaded, not
+            # answered from the detached object
+            try:
+                session = await self.get_session(session_id)
+            except KeyError:
+                await ws.send_json({"type": "error", "error": "Unknown session"})
+                break
+            replies = self.reply(session, message)
+            try:
+                async for text in replies:
+                    await ws.send_json({"type": "token", "text": text})
+                await ws.send_json({"type": "done", "stats": session.last_stats})
+            except SessionBusy:
+                await ws.send_json({"type": "error", "error": "Session busy, retry later"})
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                await ws.send_json({"type": "error", "error": str(e)})
+            finally:
+                await replies.aclose()
+        
+        return ws
+    
+    async def handle_health(self, request):
+        return web.json_response({"hot_sessions": len(self.sessions), "known_keys": len(self.api_keys)})
+    
+    async def _on_startup(self, app):
+        self._http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120))
+        self._evictor = asyncio.create_task(self._evict_loop())
+    
+    async def _on_cleanup(self, app):
+        self._evictor.cancel()
+        # Persist every hot session on shutdown
+        for session in list(self.sessions.values()):
+            self._write_session(session.to_dict())
+        await self._http.close()
+    
+    def make_app(self):
+        app = web.Application()
+        app.add_routes([
+            web.get("/health", self.handle_health),
+            web.post("/sessions", self.handle_create),
+            web.get("/sessions/{session_id}", self.handle_info),
+            web.delete("/sessions/{session_id}", self.handle_delete),
+            web.post("/sessions/{session_id}/messages", self.handle_message),
+            web.get("/sessions/{session_id}/ws", self.handle_websocket)
+        ])
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-session chat server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--sessions-dir", default="chat_sessions")
+    parser.add_argument("--idle-timeout", type=float, default=300, help="seconds before an idle session is moved to disk")
+    parser.add_argument("--max-pending", type=int, default=2, help="turns a session may have waiting before 429")
+    args = parser.parse_args()
+    
+    server = ChatServer(args.sessions_dir, args.idle_timeout, args.max_pending)
+    print(f"🌟 Chat server listening on http://{args.host}:{args.port}")
+    web.run_app(server.make_app(), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,108 @@
+# test_server.py
+import asyncio
+import os
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from server import ChatServer
+
+
+def run(test):
+    """Run `test(server, client)` against a ChatServer using the fake provider"""
+    async def main(sessions_dir):
+        server = ChatServer(sessions_dir, idle_timeout=300)
+        async with TestClient(TestServer(server.make_app())) as client:
+            await test(server, client)
+    return main
+
+
+def age(server, session_id, seconds=1000):
+    """Make a hot session look idle for `seconds`"""
+    server.sessions[session_id].last_active -= seconds
+
+
+async def create(client, **fields):
+    response = await client.post("/sessions", json={"provider": "fake", **fields})
+    assert response.status == 201
+    return (await response.json())["session_id"]
+
+
+def test_create_validates_input(tmp_path):
+    async def test(server, client):
+        response = await client.post("/sessions", data="{not json", headers={"Content-Type": "application/json"})
+        assert response.status == 400
+        for budget in ("100", 0, -5, True):
+            response = await client.post("/sessions", json={"provider": "fake", "budget": budget})
+            assert response.status == 400
+        response = await client.post("/sessions", json={"provider": "groq", "base_url": "http://127.0.0.1:1/"})
+        assert response.status == 400
+        response = await client.post("/sessions", json={"provider": "nope"})
+        assert response.status == 400
+        assert await create(client, budget=500)
+    asyncio.run(run(test)(str(tmp_path)))
+
+
+def test_message_streams_reply(tmp_path):
+    async def test(server, client):
+        session_id = await create(client)
+        response = await client.post(f"/sessions/{session_id}/messages", json={"message": "hello there"})
+        assert response.status == 200
+        assert (await response.text()).strip() == "You said: hello there"
+        info = await (await client.get(f"/sessions/{session_id}")).json()
+        assert info["turns"] == 1
+        response = await client.post(f"/sessions/{session_id}/messages", json={"message": " "})
+        assert response.status == 400
+    asyncio.run(run(test)(str(tmp_path)))
+
+
+def test_websocket_streams_tokens(tmp_path):
+    async def test(server, client):
+        session_id = await create(client)
+        async with client.ws_connect(f"/sessions/{session_id}/ws") as ws:
+            await ws.send_json({"message": "over the socket"})
+            tokens = []
+            while True:
+                event = await ws.receive_json()
+                if event["type"] != "token":
+                    break
+                tokens.append(event["text"])
+        assert event["type"] == "done"
+        assert "".join(tokens).strip() == "You said: over the socket"
+    asyncio.run(run(test)(str(tmp_path)))
+
+
+def test_eviction_persists_and_reloads(tmp_path):
+    async def test(server, client):
+        session_id = await create(client)
+        response = await client.post(f"/sessions/{session_id}/messages", json={"message": "first"})
+        await response.text()  # the turn ends when the stream does
+        
+        age(server, session_id)
+        assert await server.evict_idle() == 1
+        assert session_id not in server.sessions
+        assert os.path.exists(os.path.join(str(tmp_path), f"{session_id}.json"))
+        
+        response = await client.post(f"/sessions/{session_id}/messages", json={"message": "second"})
+        assert (await response.text()).strip() == "You said: second"
+        assert server.sessions[session_id].turns == 2
+    asyncio.run(run(test)(str(tmp_path)))
+
+
+def test_websocket_turn_after_eviction_is_kept(tmp_path):
+    async def test(server, client):
+        session_id = await create(client)
+        async with client.ws_connect(f"/sessions/{session_id}/ws") as ws:
+            # The socket stays open while the session is moved to disk
+            age(server, session_id)
+            await server.evict_idle()
+            assert session_id not in server.sessions
+            
+            await ws.send_json({"message": "still here"})
+            while (await ws.receive_json())["type"] == "token":
+                pass
+                
+        age(server, session_id)
+        await server.evict_idle()
+        info = await (await client.get(f"/sessions/{session_id}")).json()
+        assert info["turns"] == 1
+    asyncio.run(run(test)(str(tmp_path)))
\ No newline at end of file
@@ -1,31 +1,510 @@
 # content_generator.py
 from limma.llm import config, generate
 import json
+import csv
+import re
+import sys
+import math
+import time
+import random
+import heapq
+import hashlib
+import atexit
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from collections import OrderedDict
 from datetime import datetime
 import os
+import requests
+
+# Default chat endpoints, same ones limma.llm uses
+PROVIDER_ENDPOINTS = {
+    "openai": "https://api.openai.com/v1/chat/completions",
+    "groq": "https://api.groq.com/openai/v1/chat/completions",
+    "mistral": "https://api.mistral.ai/v1/chat/completions",
+    "gemini": "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+}
+
+# Requests per minute used by bulk jobs; adjust to your account's tier
+DEFAULT_RATE_LIMITS = {"openai": 500, "gemini": 15, "groq": 30, "mistral": 60}
+
+# Providers that return several completions for one request, and the
+# payload field that asks for them
+MULTI_COMPLETION_FIELDS = {"openai": "n", "mistral": "n", "gemini": "candidateCount"}
+
+# Blog posts and stories at least this long are written section by section
+LONG_FORM_WORDS = 1200
+
+# Which `best_for` hint suits each content type; the router uses it as a
+# small nudge on top of live measurements
+CONTENT_HINTS = {
+    "blog": "detailed content",
+    "social": "quick responses",
+    "code": "code",
+    "email": "quick responses",
+    "poem": "creative writing",
+    "story": "creative writing"
+}
+
+_http = threading.local()
+
+
+def _session():
+    """One HTTP session per thread so keep-alive works without sharing state"""
+    if not hasattr(_http, "session"):
+        _http.session = requests.Session()
+    return _http.session
+
+
+def _build_request(provider, api_key, model, prompt, n=1):
+    """Return (url, headers, payload) for one request to a provider
+    
+    `n` > 1 asks for several completions, through the provider's field in
+    MULTI_COMPLETION_FIELDS.
+    """
+    if n > 1 and provider not in MULTI_COMPLETION_FIELDS:
+        raise ValueError(f"{provider} can't return several completions in one request")
+        
+    if provider == "gemini":
+        url = PROVIDER_ENDPOINTS["gemini"].format(model=model)
+        headers = {"x-goog-api-key": api_key, "Content-Type": "application/json"}
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        # Gemini takes generation settings in their own object
+        options = payload.setdefault("generationConfig", {}) if n > 1 else None
+    else:
+        url = PROVIDER_ENDPOINTS[provider]
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        payload = {"model": model, "messages": [{"role": "user", "content": prompt}]}
+        options = payload
+    if n > 1:
+        options[MULTI_COMPLETION_FIELDS[provider]] = n
+    return url, headers, payload
+
+
+def send_prompt(provider, api_key, model, prompt, timeout=120, with_usage=False):
+    """Send a prompt with its own provider/model/key.
+    
+    Unlike limma's config()/generate() pair this does not touch any global
+    state, so several calls can run at the same time from different threads.
+    With `with_usage=True` it returns (text, prompt tokens, completion tokens)
+    as reported by the provider, or None for counts it doesn't report.
+    """
+    url, headers, payload = _build_request(provider, api_key, model, prompt)
+    response = _session().post(url, headers=headers, json=payload, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    
+    try:
+        if provider == "gemini":
+            text = data["candidates"][0]["content"]["parts"][0]["text"]
+            usage = data.get("usageMetadata", {})
+            prompt_tokens, completion_tokens = usage.get("promptTokenCount"), usage.get("candidatesTokenCount")
+        else:
+            text = data["choices"][0]["message"]["content"]
+            usage = data.get("usage") or {}
+            prompt_tokens, completion_tokens = usage.get("prompt_tokens"), usage.get("completion_tokens")
+    except (KeyError, IndexError):
+        raise RuntimeError(f"Unexpected {provider} response: {data}")
+    return (text, prompt_tokens, completion_tokens) if with_usage else text
+
+
+def send_prompt_n(provider, api_key, model, prompt, n, timeout=120):
+    """Ask for `n` completions of one prompt in a single request; returns their texts"""
+    url, headers, payload = _build_request(provider, api_key, model, prompt, n)
+    response = _session().post(url, headers=headers, json=payload, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    
+    try:
+        if provider == "gemini":
+            return [c["content"]["parts"][0]["text"] for c in data["candidates"]]
+        return [choice["message"]["content"] for choice in data["choices"]]
+    except (KeyError, IndexError):
+        raise RuntimeError(f"Unexpected {provider} response: {data}")
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English text)"""
+    return max(1, round(len(text) / 4))
+
+
+class RateLimiter:
+    """Spaces calls evenly so no more than `per_minute` start in any minute"""
+    
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute
+        self.next_time = 0.0
+        self._lock = threading.Lock()
+        
+    def reserve(self):
+        """Book the next free slot and return the seconds until it starts (0 if now)"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        return start - now
+        
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+            
+            
+class RateLimited(Exception):
+    """A request's rate-limit slot is booked but `delay` seconds away
+    
+    Bulk workers raise this instead of sleeping, so the row can be handed
+    back and resubmitted when its slot comes up.
+    """
+    
+    def __init__(self, provider, delay):
+        super().__init__(f"{provider} rate limit: next slot in {delay:.1f}s")
+        self.provider = provider
+        self.delay = delay
+
+class ResponseCache:
+    """Two-tier cache for generated content
+    
+    Entries are addressed by a hash of (provider, model, template, params).
+    Recently used entries live in an in-memory LRU; every entry is also
+    written to `cache_dir` so it survives restarts. Entries older than `ttl`
+    seconds are treated as misses, and the least recently used files are
+    removed once the directory grows past `max_disk_bytes`.
+    """
+    
+    def __init__(self, cache_dir="content_cache", max_entries=256, max_disk_bytes=50 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.memory = OrderedDict()  # key -> entry
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0,
+                      "bypassed": 0, "refreshed": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.disk_bytes = sum(size for _, size, _ in self._disk_entries())
+        
+    @staticmethod
+    def make_key(provider, model, template, params):
+        raw = json.dumps([provider, model, template, params], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+        
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+        
+    def _disk_entries(self):
+        """(path, size, last used) of every file in the disk tier"""
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    stat = os.stat(os.path.join(root, name))
+                    yield os.path.join(root, name), stat.st_size, stat.st_mtime
+                    
+    def _expired(self, entry):
+        return self.ttl is not None and time.time() - entry["created"] > self.ttl
+        
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            
+    def _remove_file(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self.disk_bytes -= size
+        except OSError:
+            pass
+            
+    def get(self, key):
+        """Cached content for `key`, or None"""
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if not self._expired(entry):
+                    self.memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return entry["content"]
+                del self.memory[key]
+                
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self.stats["misses"] += 1
+                return None
+                
+            if self._expired(entry):
+                self._remove_file(path)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+                
+            os.utime(path)  # mark as recently used for disk eviction
+            self._remember(key, entry)
+            self.stats["disk_hits"] += 1
+            return entry["content"]
+            
+    def put(self, key, content, **meta):
+        """Store content in both tiers"""
+        entry = {"content": content, "created": time.time(), **meta}
+        data = json.dumps(entry).encode('utf-8')
+        path = self._path(key)
+        
+        with self._lock:
+            self._remember(key, entry)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                self._remove_file(path)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            self.disk_bytes += len(data)
+            
+            if self.disk_bytes > self.max_disk_bytes:
+                self._evict()
+                
+    def _evict(self):
+        """Drop the least recently used files until the disk tier is 90% of its cap"""
+        target = self.max_disk_bytes * 0.9
+        for path, _, _ in sorted(self._disk_entries(), key=lambda e: e[2]):
+            if self.disk_bytes <= target:
+                break
+            self._remove_file(path)
+            self.memory.pop(os.path.basename(path)[:-len(".json")], None)
+            self.stats["evicted"] += 1
+            
+    def clear(self):
+        with self._lock:
+            self.memory.clear()
+            for path, _, _ in list(self._disk_entries()):
+                self._remove_file(path)
+            self.disk_bytes = 0
+            
+    def summary(self):
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_bytes": self.disk_bytes
+        }
+
+class ProviderRouter:
+    """Picks a provider/model per content type from live measurements
+    
+    For every (content type, provider, model) it keeps an exponentially
+    weighted moving average of latency, error rate and tokens/second in a
+    small JSON stats table. Candidates are ranked by latency, cost per token
+    and throughput relative to the best candidate, inflated by their error
+    rate. A candidate that fails `failure_threshold` times in a row is
+    skipped for `cooldown` seconds. Recording a request only updates the
+    table in memory; it is written to disk at most every `flush_interval`
+    seconds and at exit, so requests never wait on the file.
+    """
+    
+    def __init__(self, stats_file="router_stats.json", alpha=0.3, weights=None, failure_threshold=3, cooldown=120,
+                 flush_interval=5.0):
+        self.stats_file = stats_file
+        self.alpha = alpha
+        self.weights = {"latency": 1.0, "cost": 1.0, "throughput": 0.5, **(weights or {})}
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.flush_interval = flush_interval
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._timer = None
+        self._version = 0  # bumped by every change
+        self._saved_version = 0
+        if os.path.exists(stats_file):
+            with open(stats_file, 'r') as f:
+                self.stats = json.load(f)
+        atexit.register(self.save)
+        
+    def _entry(self, content_type, provider, model, create=True):
+        key = f"{content_type}|{provider}|{model}"
+        entry = self.stats.get(key) or {
+            "latency": None, "error_rate": 0.0, "tokens_per_sec": None,
+            "calls": 0, "failures": 0, "consecutive_failures": 0, "last_failure": 0
+        }
+        if create:
+            self.stats[key] = entry
+        return entry
+        
+    def _ewma(self, old, new):
+        return new if old is None else self.alpha * new + (1 - self.alpha) * old
+        
+    def record(self, content_type, provider, model, elapsed=None, tokens=0, error=None):
+        """Fold the outcome of one request into the stats table"""
+        with self._lock:
+            entry = self._entry(content_type, provider, model)
+            entry["calls"] += 1
+            entry["error_rate"] = self._ewma(entry["error_rate"], 1.0 if error else 0.0)
+            if error:
+                entry["failures"] += 1
+                entry["consecutive_failures"] += 1
+                entry["last_failure"] = time.time()
+            else:
+                entry["consecutive_failures"] = 0
+                entry["latency"] = self._ewma(entry["latency"], elapsed)
+                if tokens and elapsed:
+                    entry["tokens_per_sec"] = self._ewma(entry["tokens_per_sec"], tokens / elapsed)
+            self._version += 1
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.save)
+                self._timer.daemon = True
+                self._timer.start()
+                
+    def save(self):
+        """Write the stats table if it changed since the last save"""
+        with self._lock:
+            self._timer = None
+            version = self._version
+            if version == self._saved_version:
+                return
+            data = json.dumps(self.stats, indent=2)
+            
+        with self._write_lock:
+            # A slower save of an older snapshot must not overwrite a newer one
+            if version <= self._saved_version:
+                return
+            temp_path = self.stats_file + ".tmp"
+            with open(temp_path, 'w') as f:
+                f.write(data)
+            os.replace(temp_path, self.stats_file)
+            self._saved_version = version
+        
+    def available(self, entry):
+        return (entry["consecutive_failures"] < self.failure_threshold
+                or time.time() - entry["last_failure"] > self.cooldown)
+                
+    def rank(self, content_type, candidates):
+        """Rank (provider, model, cost_per_1k, best_for) candidates, best first"""
+        with self._lock:
+            entries = [dict(self._entry(content_type, p, m, create=False)) for p, m, _, _ in candidates]
+            
+        measured_latency = sorted(e["latency"] for e in entries if e["latency"] is not None)
+        measured_tps = sorted(e["tokens_per_sec"] for e in entries if e["tokens_per_sec"])
+        # Unmeasured candidates are assumed to be typical, so they still get tried
+        prior_latency = measured_latency[len(measured_latency) // 2] if measured_latency else 5.0
+        prior_tps = measured_tps[len(measured_tps) // 2] if measured_tps else 50.0
+        
+        ranking = []
+        for (provider, model, cost, best_for), entry in zip(candidates, entries):
+            ranking.append({
+                "provider": provider,
+                "model": model,
+                "latency": entry["latency"] if entry["latency"] is not None else prior_latency,
+                "tokens_per_sec": entry["tokens_per_sec"] or prior_tps,
+                "error_rate": entry["error_rate"],
+                "cost": cost,
+                "measured": entry["latency"] is not None,
+                "calls": entry["calls"],
+                "suited": CONTENT_HINTS.get(content_type) in best_for,
+                "available": self.available(entry)
+            })
+        if not ranking:
+            return ranking
+            
+        best_latency = min(c["latency"] for c in ranking) or 1e-9
+        best_cost = min(c["cost"] for c in ranking) or 1e-9
+        best_tps = max(c["tokens_per_sec"] for c in ranking)
+        for c in ranking:
+            score = (self.weights["latency"] * c["latency"] / best_latency
+                     + self.weights["cost"] * c["cost"] / best_cost
+                     + self.weights["throughput"] * best_tps / c["tokens_per_sec"])
+            # Failed requests have to be retried elsewhere, which costs extra
+            score /= 1 - min(c["error_rate"], 0.9)
+            c["score"] = score * (0.9 if c["suited"] else 1.0)
+            
+        ranking.sort(key=lambda c: (not c["available"], c["score"]))
+        return ranking
+        
+    def explain(self, content_type, ranking):
+        """One human-readable sentence on why the top candidate was chosen"""
+        if not ranking:
+            return "No providers available"
+        best = ranking[0]
+        if best["measured"]:
+            details = (f"{best['latency']:.2f}s avg latency, {best['error_rate']:.0%} errors, "
+                       f"{best['tokens_per_sec']:.0f} tokens/s")
+        elif best["calls"]:
+            details = f"no successful requests yet, {best['error_rate']:.0%} errors"
+        else:
+            details = "no measurements yet"
+        details += f", ${best['cost']:.4f}/1K tokens"
+        if best["suited"]:
+            details += f", suited for {CONTENT_HINTS[content_type]}"
+        text = f"🧭 Picked {best['provider']}/{best['model']} for {content_type}: {details}"
+        if len(ranking) > 1:
+            runner_up = ranking[1]
+            text += (f". Runner-up: {runner_up['provider']}/{runner_up['model']} "
+                     f"(score {runner_up['score']:.2f} vs {best['score']:.2f})")
+        skipped = [f"{c['provider']}/{c['model']}" for c in ranking if not c["available"]]
+        if skipped:
+            text += f". Cooling down after repeated failures: {', '.join(skipped)}"
+        return text
+
+class MinHasher:
+    """MinHash signatures of word shingles for fast near-duplicate detection
+    
+    The share of equal positions in two signatures estimates the Jaccard
+    similarity of the texts' sets of `shingle_size`-word shingles.
+    """
+    
+    PRIME = (1 << 61) - 1
+    
+    def __init__(self, num_perm=64, shingle_size=3, seed=1):
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self.permutations = [(rng.randrange(1, self.PRIME), rng.randrange(0, self.PRIME)) for _ in range(num_perm)]
+        
+    def shingles(self, text):
+        words = re.findall(r"\w+", text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        return {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+        
+    def signature(self, text):
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big')
+                  for s in self.shingles(text)]
+        return [min((a * h + b) % self.PRIME for h in hashes) for a, b in self.permutations]
+        
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
 
 class ContentGenerator:
-    def __init__(self):
+    def __init__(self, cache_dir="content_cache", router_stats="router_stats.json"):
         self.providers = {
             "openai": {
                 "api_key": os.getenv("OPENAI_API_KEY"),
                 "models": ["gpt-5", "gpt-3.5-turbo"],
-                "best_for": ["creative writing", "detailed content"]
+                "best_for": ["creative writing", "detailed content"],
+                "cost_per_1k_tokens": {"gpt-5": 0.01, "gpt-3.5-turbo": 0.0015}
             },
             "gemini": {
                 "api_key": os.getenv("GEMINI_API_KEY"),
                 "models": ["gemini-2.5-flash", "gemini-3-flash-preview"],
-                "best_for": ["quick responses", "free tier"]
+                "best_for": ["quick responses", "free tier"],
+                "cost_per_1k_tokens": {"gemini-2.5-flash": 0.0025, "gemini-3-flash-preview": 0.003}
             },
             "groq": {
                 "api_key": os.getenv("GROQ_API_KEY"),
                 "models": ["moonshotai/kimi-k2-instruct-0905", "llama-3.3-70b-versatile"],
-                "best_for": ["ultra-fast generation", "code"]
+                "best_for": ["ultra-fast generation", "code"],
+                "cost_per_1k_tokens": {"moonshotai/kimi-k2-instruct-0905": 0.003, "llama-3.3-70b-versatile": 0.0008}
             },
             "mistral": {
                 "api_key": os.getenv("MISTRAL_API_KEY"),
                 "models": ["mistral-large-latest", "mistral-medium"],
-                "best_for": ["technical content", "analysis"]
+                "best_for": ["technical content", "analysis"],
+                "cost_per_1k_tokens": {"mistral-large-latest": 0.006, "mistral-medium": 0.002}
             }
         }
         
@@ -38,6 +517,13 @@ class ContentGenerator:
             "story": "Write a short {genre} story about {topic}. Length: {length} words."
         }
         
+        self.current_provider = None
+        self.current_model = None
+        self.cache = ResponseCache(cache_dir)
+        self.last_from_cache = False
+        self.router = ProviderRouter(router_stats)
+        self.last_route = None
+        
     def setup_provider(self, provider_name, model=None):
         """Configure a specific provider"""
         if provider_name in self.providers:
@@ -57,40 +543,424 @@ class ContentGenerator:
                 api_key=provider_config["api_key"],
                 model=model
             )
+            self.current_provider = provider_name
+            self.current_model = model
             return True
         return False
         
-    def generate_content(self, content_type, params):
-        """Generate content based on type and parameters"""
+    def generate_content(self, content_type, params, use_cache=True, refresh=False):
+        """Generate content based on type and parameters
+        
+        Identical requests (same provider, model, template and params) are
+        served from the response cache. `use_cache=False` skips the cache
+        entirely; `refresh=True` generates again and replaces the cached entry.
+        """
         if content_type not in self.content_templates:
             return None
             
         template = self.content_templates[content_type]
         prompt = template.format(**params)
+        key = ResponseCache.make_key(self.current_provider, self.current_model, template, params)
+        self.last_from_cache = False
         
+        if not use_cache:
+            self.cache.stats["bypassed"] += 1
+        elif refresh:
+            self.cache.stats["refreshed"] += 1
+        else:
+            content = self.cache.get(key)
+            if content is not None:
+                self.last_from_cache = True
+                print(f"\n⚡ {content_type.capitalize()} served from cache")
+                return content
+                
         print(f"\nGenerating {content_type}...")
         print(f"Prompt: {prompt[:100]}...")
         
+        start_time = time.time()
         try:
             content = generate(prompt)
+            self.router.record(content_type, self.current_provider, self.current_model,
+                               time.time() - start_time, estimate_tokens(content or ""))
+            if use_cache and content:
+                self.cache.put(key, content, provider=self.current_provider,
+                               model=self.current_model, content_type=content_type)
             return content
         except Exception as e:
+            self.router.record(content_type, self.current_provider, self.current_model, error=e)
             print(f"Error generating content: {e}")
             return None
             
+    def _router_candidates(self):
+        """(provider, model, cost per 1K tokens, best_for) for every provider with an API key"""
+        return [
+            (name, model, provider["cost_per_1k_tokens"][model], provider["best_for"])
+            for name, provider in self.providers.items() if provider["api_key"]
+            for model in provider["models"]
+        ]
+        
+    def _route_and_generate(self, content_type, params, use_cache=True, limiters=None, verbose=True,
+                            reserved=None, tried=None):
+        """Generate with the best ranked candidate, failing over down the ranking
+        
+        Returns (content, chosen candidate, from_cache); content is None if
+        every candidate failed. With `limiters`, a candidate whose provider
+        has no free slot raises RateLimited once one is booked; call again
+        with `reserved` set to that provider when the slot is due. Failed
+        candidates are added to `tried` (if given) and skipped next time.
+        """
+        template = self.content_templates[content_type]
+        prompt = template.format(**params)
+        ranking = self.router.rank(content_type, self._router_candidates())
+        if verbose:
+            print(self.router.explain(content_type, ranking))
+            
+        for choice in ranking:
+            provider, model = choice["provider"], choice["model"]
+            if tried is not None and (provider, model) in tried:
+                continue
+            key = ResponseCache.make_key(provider, model, template, params)
+            if use_cache:
+                content = self.cache.get(key)
+                if content is not None:
+                    return content, choice, True
+                    
+            if limiters:
+                if provider == reserved:
+                    reserved = None
+                else:
+                    delay = limiters[provider].reserve()
+                    if delay > 0:
+                        raise RateLimited(provider, delay)
+            start_time = time.time()
+            try:
+                content = send_prompt(provider, self.providers[provider]["api_key"], model, prompt)
+            except Exception as e:
+                self.router.record(content_type, provider, model, error=e)
+                if tried is not None:
+                    tried.add((provider, model))
+                if verbose:
+                    print(f"⚠️  {provider}/{model} failed ({e}), failing over")
+                continue
+            self.router.record(content_type, provider, model, time.time() - start_time, estimate_tokens(content))
+            if use_cache and content:
+                self.cache.put(key, content, provider=provider, model=model, content_type=content_type)
+            return content, choice, False
+            
+        return None, None, False
+        
+    def generate_routed(self, content_type, params, use_cache=True):
+        """Generate content with the provider/model the router picks"""
+        if content_type not in self.content_templates:
+            return None
+        print(f"\nGenerating {content_type}...")
+        content, choice, cached = self._route_and_generate(content_type, params, use_cache)
+        self.last_route = choice
+        self.last_from_cache = cached
+        if content is None:
+            print("Error generating content: every provider failed")
+        elif cached:
+            print(f"⚡ {content_type.capitalize()} served from cache ({choice['provider']}/{choice['model']})")
+        return content
+        
+    def _is_long_form(self, content_type, params):
+        try:
+            return content_type in ("blog", "story") and int(params.get("length", 0)) >= LONG_FORM_WORDS
+        except ValueError:
+            return False
+            
+    def _send_with_failover(self, content_type, prompt, candidates):
+        """Send a prompt to the first (provider, model) that answers; returns (text, seconds)"""
+        last_error = None
+        for provider, model in candidates:
+            start_time = time.time()
+            try:
+                content = send_prompt(provider, self.providers[provider]["api_key"], model, prompt)
+            except Exception as e:
+                self.router.record(content_type, provider, model, error=e)
+                last_error = e
+                continue
+            elapsed = time.time() - start_time
+            self.router.record(content_type, provider, model, elapsed, estimate_tokens(content))
+            return content, elapsed
+        raise RuntimeError(f"every provider failed: {last_error}")
+        
+    def _parse_outline(self, text, n_sections):
+        """[(title, summary), ...] from the model's outline, JSON or a numbered list"""
+        match = re.search(r"\[.*\]", text, re.DOTALL)
+        if match:
+            try:
+                items = json.loads(match.group(0))
+                outline = [(str(item.get("title", "")).strip(), str(item.get("summary", "")).strip())
+                           for item in items if isinstance(item, dict) and item.get("title")]
+                if outline:
+                    return outline
+            except ValueError:
+                pass
+                
+        outline = []
+        for line in text.splitlines():
+            # Only numbered or bulleted lines, so a preamble like "Here is the outline:" isn't a section
+            item = re.match(r"^\s*(?:#+\s*)?\**\s*(?:\d+[.)]|[-*•])\s+(.*)", line)
+            line = item.group(1).strip().strip("*") if item else ""
+            if line:
+                title, _, summary = line.partition(" - ") if " - " in line else line.partition(": ")
+                outline.append((title.strip().strip("*").strip(), summary.strip()))
+        return outline[:n_sections] or [(f"Part {i + 1}", "") for i in range(n_sections)]
+        
+    def generate_long_form(self, content_type, params, output_file=None, provider=None, model=None,
+                           section_words=400, max_workers=None):
+        """Write a long blog post or story as an outline plus parallel sections
+        
+        The model first drafts an outline. Every section is then written at
+        the same time, each with the whole outline as shared context, so the
+        wall-clock time is roughly that of the longest section rather than the
+        whole piece (by default there is one worker per section for that
+        reason). A short bridge is written for each pair of neighbouring
+        sections to smooth the transition. Sections are appended to
+        `output_file` in order as soon as they and their bridge are ready.
+        """
+        if provider in (None, "auto") and (provider == "auto" or not self.current_provider):
+            ranking = self.router.rank(content_type, self._router_candidates())
+            print(self.router.explain(content_type, ranking))
+            candidates = [(c["provider"], c["model"]) for c in ranking]
+        else:
+            provider = provider or self.current_provider
+            model = model or (self.current_model if provider == self.current_provider else None)
+            candidates = [(provider, model or self.providers[provider]["models"][0])]
+        if not candidates:
+            print("No providers with API keys configured")
+            return None
+            
+        length = int(params.get("length") or 1500)
+        n_sections = max(2, math.ceil(length / section_words))
+        words = round(length / n_sections)
+        subject = self.content_templates[content_type].format(**params)
+        output_file = output_file or f"{content_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
+        start_time = time.time()
+        
+        print(f"\nOutlining a {length}-word {content_type} in {n_sections} sections...")
+        try:
+            outline_text, _ = self._send_with_failover(content_type, (
+                f'We are writing this piece in {n_sections} sections: "{subject}"\n'
+                f'Return its outline as a JSON array of {n_sections} objects with "title" and '
+                f'"summary" (one sentence) keys. Return only the JSON.'
+            ), candidates)
+        except RuntimeError as e:
+            print(f"Error generating content: {e}")
+            return None
+        outline = self._parse_outline(outline_text, n_sections)
+        n_sections = len(outline)
+        outline_list = "\n".join(f"{i}. {title}: {summary}" for i, (title, summary) in enumerate(outline, 1))
+        
+        def section_prompt(i):
+            title, summary = outline[i]
+            opening = "Open the piece." if i == 0 else "Don't introduce the piece again."
+            ending = "Bring the piece to a close." if i == n_sections - 1 else "Don't conclude the piece yet."
+            return (f'You are writing section {i + 1} of {n_sections} of this piece: "{subject}"\n\n'
+                    f"Full outline:\n{outline_list}\n\n"
+                    f'Write only section {i + 1}, "{title}": {summary}\n'
+                    f"Aim for about {words} words. {opening} {ending} "
+                    f"Keep the style and tone of the whole piece and don't repeat the section title.")
+                    
+        def bridge_prompt(i):
+            return (f"These are the end of one section of a {content_type} and the start of the next.\n\n"
+                    f"END OF SECTION:\n...{sections[i - 1][-600:]}\n\n"
+                    f"START OF NEXT SECTION:\n{sections[i][:600]}...\n\n"
+                    f"Write one or two sentences to put at the start of the next section so the two "
+                    f"connect smoothly. Return only those sentences.")
+                    
+        sections = [None] * n_sections
+        section_times = [0.0] * n_sections
+        bridges = {}
+        jobs = {}  # future -> ("section" | "bridge", index)
+        next_to_write = 0
+        
+        with open(output_file, 'w', encoding='utf-8') as out, \
+                ThreadPoolExecutor(max_workers=max_workers or n_sections) as pool:
+            title = params.get("topic", content_type).strip()
+            out.write(f"# {title[:1].upper() + title[1:]}\n\n")
+            out.flush()
+            for i in range(n_sections):
+                jobs[pool.submit(self._send_with_failover, content_type, section_prompt(i), candidates)] = ("section", i)
+            pending = set(jobs)
+            
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, i = jobs[future]
+                    if kind == "bridge":
+                        try:
+                            bridges[i] = future.result()[0].strip()
+                        except RuntimeError:
+                            bridges[i] = ""
+                        continue
+                        
+                    try:
+                        sections[i], section_times[i] = future.result()
+                    except RuntimeError as e:
+                        for other in pending:
+                            other.cancel()
+                        print(f"Error generating section {i + 1}: {e}")
+                        print(f"Partial piece saved to {output_file}")
+                        return None
+                    sections[i] = sections[i].strip()
+                    # Bridge this section to its neighbours once both are written
+                    for j in (i, i + 1):
+                        if 0 < j < n_sections and sections[j - 1] is not None and sections[j] is not None:
+                            bridge = pool.submit(self._send_with_failover, content_type, bridge_prompt(j), candidates)
+                            jobs[bridge] = ("bridge", j)
+                            pending.add(bridge)
+                            
+                while (next_to_write < n_sections and sections[next_to_write] is not None
+                       and (next_to_write == 0 or next_to_write in bridges)):
+                    i = next_to_write
+                    heading = f"## {outline[i][0]}\n\n" if content_type == "blog" else ""
+                    bridge = f"{bridges[i]} " if bridges.get(i) else ""
+                    out.write(f"{heading}{bridge}{sections[i]}\n\n")
+                    out.flush()
+                    next_to_write += 1
+                    print(f"✍️  Section {i + 1}/{n_sections} written ({section_times[i]:.1f}s)")
+                    
+        total_time = time.time() - start_time
+        print(f"\n✅ {content_type.capitalize()} saved to {output_file} in {total_time:.1f}s "
+              f"(longest section {max(section_times):.1f}s, all sections {sum(section_times):.1f}s)")
+        with open(output_file, 'r', encoding='utf-8') as f:
+            return f.read()
+            
+    def generate_variants(self, content_type, params, n=5, provider=None, model=None,
+                          similarity_threshold=0.6, oversample=1.5, max_workers=8):
+        """Generate several different versions of one piece of content
+        
+        Providers that can return several completions per request are asked
+        once; the others get parallel requests, as do any drafts such a
+        provider comes back short of. About `oversample` times as
+        many drafts as needed are requested, near-duplicates (estimated
+        shingle Jaccard similarity of `similarity_threshold` or more) are
+        dropped, and up to `n` variants are returned, most distinct first.
+        """
+        if content_type not in self.content_templates:
+            return []
+        if provider in (None, "auto") and (provider == "auto" or not self.current_provider):
+            ranking = [c for c in self.router.rank(content_type, self._router_candidates()) if c["available"]]
+            if not ranking:
+                print("No providers with API keys configured")
+                return []
+            provider, model = ranking[0]["provider"], ranking[0]["model"]
+        else:
+            provider = provider or self.current_provider
+            model = model or (self.current_model if provider == self.current_provider else None)
+            model = model or self.providers[provider]["models"][0]
+        api_key = self.providers[provider]["api_key"]
+        prompt = self.content_templates[content_type].format(**params)
+        drafts_wanted = max(n, math.ceil(n * oversample))
+        
+        print(f"\nGenerating {drafts_wanted} drafts of {content_type} with {provider}/{model}...")
+        start_time = time.time()
+        drafts = []
+        if provider in MULTI_COMPLETION_FIELDS:
+            try:
+                drafts = send_prompt_n(provider, api_key, model, prompt, drafts_wanted)
+            except (requests.RequestException, RuntimeError) as e:
+                print(f"⚠️  {provider} couldn't return several completions at once ({e}), sending parallel requests")
+                
+        shortfall = drafts_wanted - len(drafts)
+        if shortfall > 0:
+            if drafts:
+                print(f"⚠️  {provider} returned {len(drafts)} of {drafts_wanted} drafts, requesting {shortfall} more")
+            with ThreadPoolExecutor(max_workers=min(max_workers, shortfall)) as pool:
+                futures = [pool.submit(send_prompt, provider, api_key, model, prompt) for _ in range(shortfall)]
+                for future in as_completed(futures):
+                    try:
+                        drafts.append(future.result())
+                    except Exception as e:
+                        print(f"⚠️  Draft failed: {e}")
+                        
+        elapsed = time.time() - start_time
+        variants = self.rank_by_diversity(drafts, similarity_threshold)[:n]
+        for variant in variants:
+            variant.update(provider=provider, model=model)
+        print(f"✅ {len(variants)} distinct variants from {len(drafts)} drafts in {elapsed:.1f}s")
+        return variants
+        
+    def rank_by_diversity(self, texts, similarity_threshold=0.6):
+        """Drop near-duplicate texts and order the rest, most distinct first
+        
+        Returns dicts with the `text` and its `diversity`: one minus its
+        highest similarity to any variant ranked above it.
+        """
+        hasher = MinHasher()
+        kept = []
+        for text in texts:
+            text = text.strip()
+            if not text:
+                continue
+            signature = hasher.signature(text)
+            if all(hasher.similarity(signature, other) < similarity_threshold for _, other in kept):
+                kept.append((text, signature))
+        if not kept:
+            return []
+            
+        similarity = [[hasher.similarity(a, b) for _, b in kept] for _, a in kept]
+        # Start with the variant least like the others, then keep picking the
+        # one least like anything already picked (farthest-first traversal)
+        order = [min(range(len(kept)), key=lambda i: sum(similarity[i]))]
+        closest = list(similarity[order[0]])
+        ranked = [{"text": kept[order[0]][0], "diversity": 1.0}]
+        while len(order) < len(kept):
+            best = min((i for i in range(len(kept)) if i not in order), key=lambda i: closest[i])
+            ranked.append({"text": kept[best][0], "diversity": 1.0 - closest[best]})
+            order.append(best)
+            closest = [max(c, similarity[best][i]) for i, c in enumerate(closest)]
+        return ranked
+        
+    def _timed_request(self, provider, model, prompt):
+        """Send one prompt and return the response with timing and token counts"""
+        result = {"provider": provider, "model": model, "response": None, "error": None}
+        start_time = time.time()
+        try:
+            text, prompt_tokens, completion_tokens = send_prompt(
+                provider, self.providers[provider]["api_key"], model, prompt, with_usage=True)
+            result["response"] = text
+        except Exception as e:
+            text, prompt_tokens, completion_tokens = "", None, None
+            result["error"] = str(e)
+        elapsed = time.time() - start_time
+        
+        completion_tokens = completion_tokens or (estimate_tokens(text) if text else 0)
+        result.update(
+            elapsed=elapsed,
+            prompt_tokens=prompt_tokens or estimate_tokens(prompt),
+            completion_tokens=completion_tokens,
+            tokens_per_sec=completion_tokens / elapsed if text and elapsed else 0.0
+        )
+        return result
+        
+    def compare_providers_stream(self, prompt, models=None, max_workers=None):
+        """Send a prompt to every configured provider at once
+        
+        Providers without an API key are skipped instead of prompting for
+        one. Each request carries its own provider, model and key, and
+        results are yielded in the order they finish, each with its timing
+        and token counts. `models` maps provider names to the model to use
+        (default: the provider's first model).
+        """
+        models = models or {}
+        targets = [(name, models.get(name, provider["models"][0]))
+                   for name, provider in self.providers.items() if provider["api_key"]]
+        if not targets:
+            return
+            
+        with ThreadPoolExecutor(max_workers=max_workers or len(targets)) as pool:
+            futures = [pool.submit(self._timed_request, name, model, prompt) for name, model in targets]
+            for future in as_completed(futures):
+                yield future.result()
+                
     def compare_providers(self, prompt):
         """Compare output from different providers"""
         results = {}
-        
-        for provider in self.providers.keys():
-            print(f"\nTesting {provider}...")
-            if self.setup_provider(provider, self.providers[provider]["models"][0]):
-                try:
-                    results[provider] = generate(prompt)
-                    print(f"✅ {provider} response received")
-                except Exception as e:
-                    results[provider] = f"Error: {e}"
-                    
+        for result in self.compare_providers_stream(prompt):
+            results[result["provider"]] = result["response"] or f"Error: {result['error']}"
         return results
         
     def save_content(self, content, filename=None):
@@ -102,6 +972,261 @@ class ContentGenerator:
             f.write(content)
         print(f"Content saved to {filename}")
         
+    def _stream_rows(self, params_file, invalid=None):
+        """Yield (index, row) from a CSV or JSONL parameter file without loading it whole
+        
+        JSONL lines that aren't a JSON object are skipped; their (index,
+        error) pairs are appended to `invalid` if given.
+        """
+        with open(params_file, 'r', encoding='utf-8', newline='') as f:
+            if params_file.endswith('.csv'):
+                for index, row in enumerate(csv.DictReader(f)):
+                    yield index, {k: v for k, v in row.items() if k and v not in (None, "")}
+            else:
+                for index, line in enumerate(f):
+                    if not line.strip():
+                        continue
+                    try:
+                        row = json.loads(line)
+                        if not isinstance(row, dict):
+                            raise ValueError("expected a JSON object")
+                    except ValueError as e:
+                        if invalid is not None:
+                            invalid.append((index, str(e)))
+                        continue
+                    yield index, row
+                        
+    @staticmethod
+    def _row_key(index, row):
+        digest = hashlib.sha1(json.dumps(row, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        return f"{index}:{digest}"
+        
+    def _completed_rows(self, output_file):
+        """Keys of rows already generated successfully in a previous run"""
+        done = set()
+        if not os.path.exists(output_file):
+            return done
+        with open(output_file, 'r', encoding='utf-8', newline='') as f:
+            if output_file.endswith('.csv'):
+                records = csv.DictReader(f)
+            else:
+                records = self._json_records(f)
+            for record in records:
+                if record.get('status') == 'ok' and record.get('key'):
+                    done.add(record['key'])
+        return done
+        
+    @staticmethod
+    def _json_records(lines):
+        """JSON objects from JSONL lines, skipping damaged ones (e.g. a write cut off by a crash)"""
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                yield record
+                
+    def _generate_row(self, content_type, params, provider, model, limiter, use_cache=True, reserved=False):
+        """Generate one bulk item; returns (content, from_cache)
+        
+        Raises RateLimited if the provider's next slot isn't free yet, unless
+        `reserved` says this row already booked it.
+        """
+        template = self.content_templates[content_type]
+        prompt = template.format(**params)
+        key = ResponseCache.make_key(provider, model, template, params)
+        
+        if use_cache:
+            content = self.cache.get(key)
+            if content is not None:
+                return content, True
+                
+        api_key = self.providers[provider]["api_key"]
+        if not api_key:
+            raise RuntimeError(f"No API key for {provider} (set {provider.upper()}_API_KEY)")
+            
+        if not reserved:
+            delay = limiter.reserve()
+            if delay > 0:
+                raise RateLimited(provider, delay)
+        start_time = time.time()
+        try:
+            content = send_prompt(provider, api_key, model, prompt)
+        except Exception as e:
+            self.router.record(content_type, provider, model, error=e)
+            raise
+        self.router.record(content_type, provider, model, time.time() - start_time, estimate_tokens(content))
+        if use_cache and content:
+            self.cache.put(key, content, provider=provider, model=model, content_type=content_type)
+        return content, False
+        
+    def bulk_generate(self, params_file, output_file=None, content_type=None, provider=None, model=None,
+                      max_workers=8, rate_limits=None, use_cache=True):
+        """Generate one item per row of a CSV or JSONL parameter file
+        
+        Each row holds the template parameters and may override the content
+        type (`content_type`), `provider` and `model` columns. Rows are
+        streamed from the file and generated on a bounded worker pool, with
+        every provider held to its requests-per-minute limit. A row whose
+        provider has no free slot books the next one and gives its worker
+        back, and is resubmitted when the slot comes up, so rows for a
+        slow-rate provider never keep other providers' rows waiting. Results are
+        appended to `output_file` (JSONL, or CSV if it ends in .csv) as they
+        complete; running the same job again skips rows already done.
+        """
+        output_file = output_file or f"{os.path.splitext(params_file)[0]}_output.jsonl"
+        rate_limits = {**DEFAULT_RATE_LIMITS, **(rate_limits or {})}
+        limiters = {name: RateLimiter(rate_limits[name]) for name in self.providers}
+        
+        done = self._completed_rows(output_file)
+        if done:
+            print(f"\n♻️  Resuming: {len(done)} rows already in {output_file}")
+            
+        as_csv = output_file.endswith('.csv')
+        fields = ["key", "index", "content_type", "provider", "model", "status", "cached",
+                  "elapsed", "error", "params", "content"]
+        write_lock = threading.Lock()
+        # Rows are only submitted when a worker is free, so huge files never
+        # end up in memory as pending futures. Rows waiting for a rate-limit
+        # slot sit in `deferred` (by due time) without holding a worker; at
+        # most `max_deferred` of them before reading more rows pauses
+        dispatch = threading.Condition()
+        deferred = []  # heap of (due time, sequence, job)
+        state = {"in_flight": 0, "sequence": 0}
+        max_deferred = max_workers * 16
+        invalid = []
+        progress = {"ok": 0, "failed": 0, "cached": 0, "skipped": len(done),
+                    "started": time.time(), "last_report": 0.0, "reported": 0}
+        
+        def report(final=False):
+            now = time.time()
+            finished = progress["ok"] + progress["failed"]
+            if finished == progress["reported"] or (not final and now - progress["last_report"] < 2):
+                return
+            progress["last_report"] = now
+            progress["reported"] = finished
+            rate = finished / max(now - progress["started"], 1e-9)
+            print(f"[{finished} done · {progress['ok']} ok · {progress['cached']} cached · "
+                  f"{progress['failed']} failed] {rate:.1f} rows/s")
+            
+        def submit_due():
+            # Called with dispatch held
+            now = time.monotonic()
+            while deferred and deferred[0][0] <= now and state["in_flight"] < max_workers:
+                state["in_flight"] += 1
+                pool.submit(run_row, heapq.heappop(deferred)[2])
+                
+        def next_due():
+            # With every worker busy, the next finished row wakes us instead
+            if not deferred or state["in_flight"] >= max_workers:
+                return None
+            return max(0.0, deferred[0][0] - time.monotonic())
+            
+        def run_row(job):
+            key, index = job["key"], job["index"]
+            try:
+                row = dict(job["row"])
+                row_type = row.pop("content_type", None) or content_type
+                row_provider = row.pop("provider", None) or provider or self.current_provider or "auto"
+                row_model = row.pop("model", None) or model
+                record = {"key": key, "index": index, "content_type": row_type, "provider": row_provider,
+                          "model": row_model, "params": row}
+                
+                start_time = job.setdefault("started", time.time())
+                try:
+                    if row_type not in self.content_templates:
+                        raise ValueError(f"Unknown content type: {row_type}")
+                    if row_provider != "auto":
+                        if row_provider not in self.providers:
+                            raise ValueError(f"Unknown provider: {row_provider}")
+                        row_model = row_model or self.providers[row_provider]["models"][0]
+                        record["model"] = row_model
+                    if row_provider == "auto":
+                        content, choice, cached = self._route_and_generate(
+                            row_type, row, use_cache, limiters, verbose=False,
+                            reserved=job["reserved"], tried=job["tried"])
+                        if content is None:
+                            raise RuntimeError("every provider failed")
+                        record.update(provider=choice["provider"], model=choice["model"])
+                    else:
+                        content, cached = self._generate_row(row_type, row, row_provider, row_model,
+                                                             limiters[row_provider], use_cache,
+                                                             reserved=job["reserved"] == row_provider)
+                    record.update(status="ok", cached=cached, content=content, error="")
+                except RateLimited as e:
+                    # Hand the worker back; the row runs again when its slot is due
+                    job["reserved"] = e.provider
+                    with dispatch:
+                        state["sequence"] += 1
+                        heapq.heappush(deferred, (time.monotonic() + e.delay, state["sequence"], job))
+                    return
+                except Exception as e:
+                    record.update(status="error", cached=False, content="", error=str(e))
+                record["elapsed"] = round(time.time() - start_time, 3)
+                
+                with write_lock:
+                    if as_csv:
+                        writer.writerow({**record, "params": json.dumps(row)})
+                    else:
+                        out.write(json.dumps(record) + "\n")
+                    out.flush()
+                    
+                    if record["status"] == "ok":
+                        progress["ok"] += 1
+                        progress["cached"] += record["cached"]
+                    else:
+                        progress["failed"] += 1
+                    report()
+            finally:
+                with dispatch:
+                    state["in_flight"] -= 1
+                    dispatch.notify_all()
+                    
+                    
+        new_file = not os.path.exists(output_file) or os.path.getsize(output_file) == 0
+        with open(output_file, 'a', encoding='utf-8', newline='') as out:
+            writer = csv.DictWriter(out, fieldnames=fields) if as_csv else None
+            if as_csv and new_file:
+                writer.writeheader()
+            elif not new_file:
+                # A crash can leave a half-written last line; start on a fresh one
+                with open(output_file, 'rb') as check:
+                    check.seek(-1, os.SEEK_END)
+                    if check.read(1) != b"\n":
+                        out.write("\n")
+                
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                for index, row in self._stream_rows(params_file, invalid):
+                    key = self._row_key(index, row)
+                    if key in done:
+                        continue
+                    job = {"key": key, "index": index, "row": row, "reserved": None, "tried": set()}
+                    with dispatch:
+                        # Rows whose slot is due go first
+                        while True:
+                            submit_due()
+                            if state["in_flight"] < max_workers and len(deferred) < max_deferred:
+                                break
+                            dispatch.wait(next_due())
+                        state["in_flight"] += 1
+                        pool.submit(run_row, job)
+                        
+                with dispatch:
+                    while state["in_flight"] or deferred:
+                        submit_due()
+                        dispatch.wait(next_due())
+                        
+                        
+        report(final=True)
+        for index, error in invalid:
+            print(f"⚠️  Line {index + 1} of {params_file} skipped: {error}")
+        progress["invalid"] = len(invalid)
+        if progress["failed"]:
+            print(f"⚠️  {progress['failed']} rows failed; run the job again to retry them")
+        print(f"💾 Output saved to {output_file}")
+        return {k: progress[k] for k in ("ok", "failed", "cached", "skipped", "invalid")}
+        
     def interactive_generator(self):
         """Interactive content generation session"""
         print("\n🌟 Welcome to Multi-Provider Content Generator!")
@@ -112,21 +1237,40 @@ class ContentGenerator:
             for i, ctype in enumerate(self.content_templates.keys(), 1):
                 print(f"{i}. {ctype.capitalize()}")
             print(f"{len(self.content_templates)+1}. Compare providers")
-            print(f"{len(self.content_templates)+2}. Exit")
+            print(f"{len(self.content_templates)+2}. Cache stats")
+            print(f"{len(self.content_templates)+3}. Exit")
             
-            choice = input("\nSelect content type (1-{}): ".format(len(self.content_templates)+2))
+            choice = input("\nSelect content type (1-{}): ".format(len(self.content_templates)+3))
             
-            if choice == str(len(self.content_templates)+2):
+            if choice == str(len(self.content_templates)+3):
                 print("Goodbye!")
                 break
                 
+            if choice == str(len(self.content_templates)+2):
+                stats = self.cache.summary()
+                print("\n=== Cache Stats ===")
+                print(f"Hit rate: {stats['hit_rate']:.1%} ({stats['memory_hits']} memory, {stats['disk_hits']} disk, {stats['misses']} misses)")
+                print(f"Expired: {stats['expired']}, evicted: {stats['evicted']}, refreshed: {stats['refreshed']}, bypassed: {stats['bypassed']}")
+                print(f"Entries in memory: {stats['memory_entries']}, on disk: {stats['disk_bytes'] / 1024:.1f} KB")
+                if input("Clear the cache? (y/n): ").lower() == 'y':
+                    self.cache.clear()
+                continue
+                
             if choice == str(len(self.content_templates)+1):
                 # Compare providers
                 prompt = input("Enter a test prompt: ")
-                results = self.compare_providers(prompt)
+                skipped = [name for name, provider in self.providers.items() if not provider["api_key"]]
+                if skipped:
+                    print(f"Skipping providers without an API key: {', '.join(skipped)}")
                 print("\n=== Comparison Results ===")
-                for provider, response in results.items():
-                    print(f"\n--- {provider} ---")
+                for result in self.compare_providers_stream(prompt):
+                    if result["error"]:
+                        print(f"\n--- {result['provider']} ({result['model']}) · failed after {result['elapsed']:.2f}s ---")
+                        print(f"Error: {result['error']}")
+                        continue
+                    print(f"\n--- {result['provider']} ({result['model']}) · {result['elapsed']:.2f}s · "
+                          f"{result['completion_tokens']} tokens · {result['tokens_per_sec']:.0f} tokens/s ---")
+                    response = result["response"]
                     print(response[:200] + "..." if len(response) > 200 else response)
                 continue
                 
@@ -164,16 +1308,53 @@ class ContentGenerator:
                 
                 # Select provider
                 print("\nSelect Provider:")
+                print("0. Auto (pick from live latency, errors and cost)")
                 for i, provider in enumerate(self.providers.keys(), 1):
                     print(f"{i}. {provider}")
                 
                 provider_choice = int(input("Choose provider: ")) - 1
-                provider = list(self.providers.keys())[provider_choice]
                 
+                variant_count = 1
+                if content_type in ("social", "email"):
+                    variant_count = int(input("How many variants? (Enter for 1): ") or 1)
+                    
                 # Setup and generate
+                if variant_count > 1 and (provider_choice == -1 or self.setup_provider(list(self.providers.keys())[provider_choice])):
+                    variants = self.generate_variants(content_type, params, variant_count,
+                                                      provider="auto" if provider_choice == -1 else None)
+                    for i, variant in enumerate(variants, 1):
+                        print(f"\n--- Variant {i} (diversity {variant['diversity']:.2f}) ---")
+                        print(variant["text"])
+                    keep = input("\nSave which variant? (number, 'all' or Enter to skip): ").strip().lower()
+                    if keep == 'all':
+                        self.save_content("\n\n---\n\n".join(v["text"] for v in variants))
+                    elif keep.isdigit() and 0 < int(keep) <= len(variants):
+                        self.save_content(variants[int(keep) - 1]["text"])
+                    continue
+                if provider_choice == -1 and self._is_long_form(content_type, params):
+                    self.generate_long_form(content_type, params, provider="auto")
+                    continue
+                if provider_choice == -1:
+                    content = self.generate_routed(content_type, params)
+                    if content:
+                        print("\n" + "="*50)
+                        print("GENERATED CONTENT:")
+                        print("="*50)
+                        print(content)
+                        if input("\nSave this content? (y/n): ").lower() == 'y':
+                            self.save_content(content)
+                    continue
+                    
+                provider = list(self.providers.keys())[provider_choice]
                 if self.setup_provider(provider):
+                    if self._is_long_form(content_type, params):
+                        self.generate_long_form(content_type, params)
+                        continue
                     content = self.generate_content(content_type, params)
-                    
+                    if content and self.last_from_cache:
+                        if input("Regenerate instead of using the cached version? (y/n): ").lower() == 'y':
+                            content = self.generate_content(content_type, params, refresh=True)
+                            
                     if content:
                         print("\n" + "="*50)
                         print("GENERATED CONTENT:")
@@ -189,8 +1370,33 @@ class ContentGenerator:
                 print(f"Invalid input: {e}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Multi-provider content generator")
+    parser.add_argument("--bulk", metavar="PARAMS_FILE", help="generate one item per row of a CSV or JSONL file")
+    parser.add_argument("--type", dest="content_type", help="content type for rows that don't set one")
+    parser.add_argument("--provider", help="provider for rows that don't set one, or 'auto' to let the router pick")
+    parser.add_argument("--model", help="model for rows that don't set one")
+    parser.add_argument("--output", help="output file (.jsonl or .csv)")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent requests")
+    parser.add_argument("--rpm", type=int, help="requests per minute for --provider (for every provider with auto or no --provider)")
+    parser.add_argument("--no-cache", action="store_true", help="don't read or write the response cache")
+    args = parser.parse_args()
+    
     generator = ContentGenerator()
-    generator.interactive_generator()
+    if not args.bulk:
+        generator.interactive_generator()
+        return
+        
+    rate_limits = None
+    if args.rpm:
+        # Routed rows can go to any provider, so the limit applies to all of them
+        routed = args.provider in (None, "auto")
+        rate_limits = {name: args.rpm for name in generator.providers} if routed else {args.provider: args.rpm}
+    try:
+        generator.bulk_generate(args.bulk, args.output, args.content_type, args.provider, args.model,
+                                args.workers, rate_limits, use_cache=not args.no_cache)
+    except KeyboardInterrupt:
+        print("\nStopped; run the same command again to resume")
+        sys.exit(130)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,71 +1,497 @@
 # memory_chatbot.py
-from limma.llm import config, generate, chat, reset_chat
 import json
 import os
+import re
+import math
+import time
+import zlib
+import heapq
+import atexit
+import threading
+from functools import lru_cache
+from collections import Counter, deque, OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 import hashlib
+import numpy as np
+import requests
+
+GEMINI_ENDPOINT = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+
+_http = threading.local()
+
+def _session():
+    """One HTTP session per thread so keep-alive works without sharing state"""
+    if not hasattr(_http, "session"):
+        _http.session = requests.Session()
+    return _http.session
+    
+def build_gemini_request(api_key, model, messages):
+    """Return (url, headers, payload) for a Gemini chat request
+    
+    System messages go in `systemInstruction` and assistant messages are
+    sent with Gemini's `model` role, so the model can tell its instructions,
+    the user and its own earlier replies apart.
+    """
+    url = GEMINI_ENDPOINT.format(model=model)
+    headers = {"x-goog-api-key": api_key, "Content-Type": "application/json"}
+    payload = {"contents": [
+        {"role": "model" if m["role"] == "assistant" else "user", "parts": [{"text": m["content"]}]}
+        for m in messages if m["role"] != "system"
+    ]}
+    system = [m["content"] for m in messages if m["role"] == "system"]
+    if system:
+        payload["systemInstruction"] = {"parts": [{"text": "\n\n".join(system)}]}
+    return url, headers, payload
+    
+def send_chat(api_key, model, messages, timeout=120):
+    """Send a list of {"role", "content"} messages to Gemini and return the reply text
+    
+    Every call carries its own key and model, so chatbots for different
+    users can send requests from several threads at once.
+    """
+    url, headers, payload = build_gemini_request(api_key, model, messages)
+    response = _session().post(url, headers=headers, json=payload, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    try:
+        return "".join(part.get("text", "") for part in data["candidates"][0]["content"]["parts"])
+    except (KeyError, IndexError):
+        raise RuntimeError(f"Unexpected Gemini response: {data}")
+        
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English text)"""
+    return max(1, round(len(text) / 4))
+
+def user_dir(data_dir, user_id):
+    """Directory holding one user's files: `data_dir/<first 2 hex digits of sha1(user_id)>`
+    
+    Users are spread over 256 subdirectories so none of them gets too big.
+    """
+    if not re.fullmatch(r"[\w.@+-]{1,128}", user_id):
+        raise ValueError(f"Invalid user ID: {user_id!r}")
+    return os.path.join(data_dir, hashlib.sha1(user_id.encode()).hexdigest()[:2])
+    
+def new_memory():
+    return {
+        "name": None,
+        "preferences": {},
+        "facts": [],
+        "topics": {},
+        "last_interaction": None
+    }
+
+class MemoryStore:
+    """Write-behind persistence for one user's memory and conversation log
+    
+    Turns are appended to a JSONL log instead of rewriting the whole
+    history, and memory changes only mark fields as dirty. A background
+    thread writes both once no change has come in for `flush_interval`
+    seconds (and at the latest `max_delay` seconds after the first one),
+    and again at shutdown. Memory is written to a temporary file that is
+    renamed over the old one, so a crash leaves the previous version intact
+    instead of a half-written file.
+    """
+    
+    def __init__(self, memory_file, log_file, legacy_log_file=None, flush_interval=1.0, max_delay=5.0):
+        self.memory_file = memory_file
+        self.log_file = log_file
+        self.flush_interval = flush_interval
+        self.max_delay = max_delay
+        self.lock = threading.RLock()  # held while reading or changing memory
+        self.dirty = set()
+        self._pending_turns = []
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(memory_file) or ".", exist_ok=True)
+        
+        self.memory = new_memory()
+        if os.path.exists(memory_file):
+            with open(memory_file, 'r') as f:
+                self.memory = json.load(f)
+        if legacy_log_file and os.path.exists(legacy_log_file) and not os.path.exists(log_file):
+            # One-off move from the old whole-file JSON history
+            with open(legacy_log_file, 'r') as f:
+                self._pending_turns = json.load(f)
+            self.flush()
+            
+        self._changed = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        
+    def mark_dirty(self, *fields):
+        """Schedule memory to be written; call with `lock` held after changing it"""
+        with self.lock:
+            self.dirty.update(fields)
+        self._changed.set()
+        
+    def append_turn(self, turn):
+        with self.lock:
+            self._pending_turns.append(turn)
+        self._changed.set()
+        
+    def load_turns(self, limit=100):
+        """The last `limit` logged turns (all if None), skipping a line cut short by a crash
+        
+        Only the end of the log is read, so this costs the same however long
+        the log grows.
+        """
+        if not os.path.exists(self.log_file):
+            return []
+        with open(self.log_file, 'rb') as f:
+            if limit is None:
+                lines = f.read().splitlines()
+            else:
+                # Read backwards in blocks until there are enough lines
+                end = f.seek(0, os.SEEK_END)
+                data = b""
+                while end > 0 and data.count(b"\n") <= limit:
+                    start = max(0, end - 65536)
+                    f.seek(start)
+                    data = f.read(end - start) + data
+                    end = start
+                lines = data.splitlines()
+                if end > 0:
+                    lines = lines[1:]  # probably starts mid-line
+                    
+        turns = deque(maxlen=limit)
+        for line in lines:
+            try:
+                turns.append(json.loads(line))
+            except ValueError:
+                continue
+        return list(turns)
+        
+    def _atomic_write(self, path, data):
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        
+    def flush(self):
+        """Write pending turns and dirty memory now"""
+        with self._write_lock:
+            with self.lock:
+                turns, self._pending_turns = self._pending_turns, []
+                memory_data = json.dumps(self.memory, indent=2) if self.dirty else None
+                self.dirty.clear()
+                
+            if turns:
+                with open(self.log_file, 'ab') as f:
+                    if f.tell() > 0:
+                        # Make sure a line cut short by a crash doesn't swallow ours
+                        with open(self.log_file, 'rb') as check:
+                            check.seek(-1, os.SEEK_END)
+                            if check.read(1) != b"\n":
+                                f.write(b"\n")
+                    f.write("".join(json.dumps(turn) + "\n" for turn in turns).encode('utf-8'))
+                    f.flush()
+                    os.fsync(f.fileno())
+            if memory_data is not None:
+                self._atomic_write(self.memory_file, memory_data)
+                
+    def _run(self):
+        while not self._stop.is_set():
+            self._changed.wait()
+            first_change = time.monotonic()
+            # Debounce: keep waiting while changes keep coming, up to max_delay
+            while not self._stop.is_set():
+                self._changed.clear()
+                if self._stop.wait(self.flush_interval) or not self._changed.is_set():
+                    break
+                if time.monotonic() - first_change >= self.max_delay:
+                    break
+            self.flush()
+            
+    def reset(self):
+        """Forget everything: empty memory and an empty conversation log"""
+        with self._write_lock:
+            with self.lock:
+                self.memory.clear()
+                self.memory.update(new_memory())
+                self._pending_turns = []
+                self.dirty.add("*")
+            self._atomic_write(self.log_file, "")
+        self.flush()
+        
+    def close(self):
+        """Stop the background thread and write everything still pending"""
+        if self._thread.is_alive():
+            self._stop.set()
+            self._changed.set()
+            self._thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+@lru_cache(maxsize=None)
+def _projection(buckets, dim, seed):
+    """Random projection shared by every RetrievalIndex with the same settings (read-only)"""
+    rng = np.random.default_rng(seed)
+    projection = (rng.standard_normal((buckets, dim)) / np.sqrt(dim)).astype(np.float32)
+    projection.flags.writeable = False
+    return projection
+    
+class RetrievalIndex:
+    """Local TF-IDF search over short texts (facts and past exchanges)
+    
+    Words (minus stopwords) are hashed into `buckets` features and weighted by
+    TF-IDF, and each feature adds a fixed random vector of `dim` values, so
+    every item becomes one small normalized row of a NumPy matrix (a random
+    projection keeps cosine similarities roughly intact). The matrix grows
+    by doubling, so adding items is cheap, and a search is one
+    matrix-vector product plus a partial sort.
+    """
+    
+    KINDS = ("fact", "exchange")
+    STOPWORDS = frozenset(
+        "a an the and or but if of to in on at for with about from by as is am are was were be been "
+        "do does did have has had i me my you your we our it its this that these those what which who "
+        "how when where why can could would should will just so not no yes user bot".split()
+    )
+    
+    def __init__(self, buckets=2 ** 14, dim=256, seed=7):
+        self.buckets = buckets
+        self.projection = _projection(buckets, dim, seed)
+        self.df = np.zeros(buckets, dtype=np.float32)
+        self.vectors = np.zeros((1024, dim), dtype=np.float32)
+        self.kinds = np.zeros(1024, dtype=np.int8)
+        self.items = []
+        
+    def __len__(self):
+        return len(self.items)
+        
+    def _features(self, text):
+        terms = [w for w in re.findall(r"\w+", text.lower()) if w not in self.STOPWORDS]
+        buckets = np.fromiter((zlib.crc32(t.encode('utf-8')) for t in terms), dtype=np.int64, count=len(terms))
+        return np.unique(buckets % self.buckets, return_counts=True)
+        
+    def _vector(self, buckets, counts):
+        idf = np.log((1 + len(self.items)) / (1 + self.df[buckets])) + 1
+        weights = ((1 + np.log(counts)) * idf).astype(np.float32)
+        vector = weights @ self.projection[buckets]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+        
+    def add(self, text, kind="fact"):
+        buckets, counts = self._features(text)
+        if not len(buckets):
+            return
+        self.df[buckets] += 1
+        
+        n = len(self.items)
+        if n == len(self.vectors):
+            self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+            self.kinds = np.concatenate([self.kinds, np.zeros_like(self.kinds)])
+        self.vectors[n] = self._vector(buckets, counts)
+        self.kinds[n] = self.KINDS.index(kind)
+        self.items.append(text)
+        
+    def search(self, query, k=5, kind=None, min_score=0.15):
+        """The `k` items most similar to `query` as (score, text), best first"""
+        buckets, counts = self._features(query)
+        n = len(self.items)
+        if not n or not len(buckets):
+            return []
+            
+        scores = self.vectors[:n] @ self._vector(buckets, counts)
+        if kind is not None:
+            scores[self.kinds[:n] != self.KINDS.index(kind)] = -1.0
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.items[i]) for i in top if scores[i] >= min_score]
+        
+    def clear(self):
+        self.df[:] = 0
+        self.items = []
+
+class TopicTracker:
+    """Bounded topic counts with exponential time decay
+    
+    A mention counts for less the longer ago it happened (halving every
+    `half_life` seconds). Instead of decaying every count on each update,
+    new mentions are weighted up by the time elapsed since `epoch`, which
+    keeps the order the same and makes each update O(log capacity). Only
+    `capacity` topics are kept: a min-heap finds the weakest one to evict.
+    The state is a plain dict inside memory, so it is saved with it.
+    """
+    
+    def __init__(self, state, capacity=200, half_life=7 * 24 * 3600):
+        self.state = state
+        state.setdefault("epoch", time.time())
+        self.scores = state.setdefault("scores", {})
+        self.capacity = capacity
+        self.rate = math.log(2) / half_life
+        self._rebuild_heap()
+        
+    def __len__(self):
+        return len(self.scores)
+        
+    def _rebuild_heap(self):
+        self._heap = [(score, topic) for topic, score in self.scores.items()]
+        heapq.heapify(self._heap)
+        
+    def add(self, topics, now=None):
+        now = time.time() if now is None else now
+        exponent = self.rate * (now - self.state["epoch"])
+        if exponent > 25:
+            # Move the epoch forward before the weights get too large
+            shrink = math.exp(-exponent)
+            for topic in self.scores:
+                self.scores[topic] *= shrink
+            self.state["epoch"] = now
+            self._rebuild_heap()
+            exponent = 0.0
+        weight = math.exp(exponent)
+        
+        for topic in topics:
+            score = self.scores.get(topic, 0.0) + weight
+            self.scores[topic] = score
+            heapq.heappush(self._heap, (score, topic))
+            
+        while len(self.scores) > self.capacity:
+            score, topic = heapq.heappop(self._heap)
+            # Skip heap entries left behind by later updates of the topic
+            if self.scores.get(topic) == score:
+                del self.scores[topic]
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild_heap()
+            
+    def top(self, k=10, now=None):
+        """The `k` strongest topics with their decayed counts"""
+        now = time.time() if now is None else now
+        decay = math.exp(self.rate * (self.state["epoch"] - now))
+        return [(topic, score * decay)
+                for topic, score in heapq.nlargest(k, self.scores.items(), key=lambda item: item[1])]
 
 class ContextAwareChatbot:
-    def __init__(self, user_id="default"):
+    def __init__(self, user_id="default", flush_interval=1.0, data_dir=None):
         self.user_id = user_id
-        self.memory_file = f"memory_{user_id}.json"
-        self.conversation_file = f"conversations_{user_id}.json"
+        # Files go in the working directory, or in a shard of `data_dir`
+        base_dir = user_dir(data_dir, user_id) if data_dir else ""
+        self.memory_file = os.path.join(base_dir, f"memory_{user_id}.json")
+        self.conversation_file = os.path.join(base_dir, f"conversations_{user_id}.jsonl")
+        self.store = MemoryStore(
+            self.memory_file,
+            self.conversation_file,
+            legacy_log_file=os.path.join(base_dir, f"conversations_{user_id}.json"),
+            flush_interval=flush_interval
+        )
         
         # Load or initialize memory
         self.memory = self.load_memory()
-        self.conversations = self.load_conversations()
+        self.topics = self._load_topics()
+        # Only the most recent exchanges are indexed, so startup time and
+        # memory don't grow with the log
+        self.max_indexed_turns = 2000
+        turns = self.store.load_turns(limit=self.max_indexed_turns)
+        self.conversations = turns[-100:]
         
-        # Configure LLM (using Gemini as default)
-        config(
-            provider="gemini",
-            api_key=os.getenv("GEMINI_API_KEY", "your-key-here"),
-            model="gemini-2.5-flash"
-        )
+        # Facts and recent past exchanges are searchable for each new message
+        self.index = RetrievalIndex()
+        self.indexed_facts = set()
+        self.retrieval_k = 3
+        self.retrieval_budget = 400  # tokens
+        for fact in self.memory["facts"]:
+            self._index_fact(fact)
+        for turn in turns:
+            self.index.add(f"User: {turn['user']}\nBot: {turn['bot']}", "exchange")
         
-        # System prompt with context
-        self.update_system_prompt()
+        # LLM settings (Gemini by default)
+        self.api_key = os.getenv("GEMINI_API_KEY", "")
+        self.model = "gemini-2.5-flash"
+        
+        # Messages sent to the model. The system prompt goes in front of them
+        # and is only built on the first turn, so startup makes no requests
+        self.history = []
+        self.max_history_chars = 32000
+        self.system_prompt = None
+        self._prompt_fields = None
+        
+        # What the conversation sent to the model already holds, so context
+        # is never sent twice and every request extends the previous one
+        self._carried = []  # context items carried by each history message
+        self.session_items = Counter()
+        self._context_changed = False
+        self._last_request = []
+        self._skipped_tokens = 0
+        self.turn_stats = deque(maxlen=1000)
         
     def load_memory(self):
         """Load user memory from file"""
-        if os.path.exists(self.memory_file):
-            with open(self.memory_file, 'r') as f:
-                return json.load(f)
-        return {
-            "name": None,
-            "preferences": {},
-            "facts": [],
-            "topics_discussed": [],
-            "last_interaction": None
-        }
+        return self.store.memory
         
     def save_memory(self):
-        """Save user memory to file"""
-        self.memory["last_interaction"] = datetime.now().isoformat()
-        with open(self.memory_file, 'w') as f:
-            json.dump(self.memory, f, indent=2)
+        """Queue user memory to be saved by the background writer"""
+        with self.store.lock:
+            self.memory["last_interaction"] = datetime.now().isoformat()
+            self.store.mark_dirty("last_interaction")
             
     def load_conversations(self):
         """Load conversation history"""
-        if os.path.exists(self.conversation_file):
-            with open(self.conversation_file, 'r') as f:
-                return json.load(f)
-        return []
+        return self.store.load_turns(limit=100)
         
     def save_conversation(self, user_input, bot_response):
         """Save conversation turn"""
-        self.conversations.append({
+        turn = {
             "timestamp": datetime.now().isoformat(),
             "user": user_input,
             "bot": bot_response
-        })
+        }
+        self.conversations.append(turn)
         
-        # Keep only last 100 conversations
+        # Keep only last 100 conversations in memory; the log keeps all of them
         if len(self.conversations) > 100:
             self.conversations = self.conversations[-100:]
             
-        with open(self.conversation_file, 'w') as f:
-            json.dump(self.conversations, f, indent=2)
+        self.store.append_turn(turn)
+        self.index.add(f"User: {user_input}\nBot: {bot_response}", "exchange")
+        
+    def _load_topics(self):
+        with self.store.lock:
+            topics = TopicTracker(self.memory.setdefault("topics", {}))
+            if "topics_discussed" in self.memory:
+                # Older memory files kept every mention in a list
+                topics.add(self.memory.pop("topics_discussed"))
+                self.store.mark_dirty("topics")
+        return topics
+        
+    def _index_fact(self, fact):
+        if fact not in self.indexed_facts:
+            self.indexed_facts.add(fact)
+            self.index.add(fact, "fact")
             
+    def retrieve_context(self, user_input):
+        """Facts and past exchanges most relevant to the message, within the token budget
+        
+        Items the conversation already holds are skipped. Returns the context
+        text and the items it contains.
+        """
+        sections = []
+        items = []
+        budget = self.retrieval_budget * 4  # ~4 characters per token
+        for kind, heading in (("fact", "Things the user told you:"), ("exchange", "Relevant earlier conversation:")):
+            lines = []
+            for _, text in self.index.search(user_input, self.retrieval_k, kind):
+                if text in self.session_items:
+                    self._skipped_tokens += estimate_tokens(text)
+                    continue
+                if text == user_input or len(text) > budget:
+                    continue
+                budget -= len(text)
+                items.append(text)
+                lines.append(f"- {text}" if kind == "fact" else text)
+            if lines:
+                sections.append(heading + "\n" + "\n".join(lines))
+        return "\n\n".join(sections), items
+        
+    def close(self):
+        """Write everything still pending to disk"""
+        self.store.close()
+        
     def extract_facts(self, text):
         """Extract potential facts about user"""
         facts = []
@@ -88,14 +514,39 @@ class ContextAwareChatbot:
                 
         return facts
         
+    def _user_context(self):
+        return f"""- Name: {self.memory.get('name', 'Unknown')}
+- Known preferences: {self.memory.get('preferences', {})}
+- Topics previously discussed: {', '.join(topic for topic, _ in self.topics.top(5))}"""
+        
     def update_system_prompt(self):
-        """Update system prompt with user context"""
-        context = f"""You are a helpful AI assistant chatting with {self.memory.get('name', 'a user')}.
+        """Update system prompt with user context
+        
+        The prompt is only rebuilt when the memory fields it uses change.
+        Returns True if they changed. Nothing is sent here. Once the
+        conversation has started the prompt is left alone, so requests keep
+        the same prefix, and a changed name or preferences are sent with the
+        next message instead.
+        """
+        fields = json.dumps([
+            self.memory.get('name'),
+            self.memory.get('preferences', {}),
+            sorted(topic for topic, _ in self.topics.top(5))
+        ], sort_keys=True)
+        if fields == self._prompt_fields:
+            return False
+        previous, self._prompt_fields = self._prompt_fields, fields
+        
+        if self.history:
+            # Topics shift nearly every turn; they wait for the next rebuild
+            if previous is None or json.loads(previous)[:2] != json.loads(fields)[:2]:
+                self._context_changed = True
+            return True
+            
+        self.system_prompt = f"""You are a helpful AI assistant chatting with {self.memory.get('name', 'a user')}.
 
 User Context:
-- Name: {self.memory.get('name', 'Unknown')}
-- Known preferences: {self.memory.get('preferences', {})}
-- Topics previously discussed: {', '.join(self.memory.get('topics_discussed', [])[-5:])}
+{self._user_context()}
 
 Guidelines:
 1. Be friendly and conversational
@@ -104,46 +555,104 @@ Guidelines:
 4. Be concise but helpful
 5. Adapt to user's communication style
 """
+        self._context_changed = False
+        return True
         
-        # Reset chat and set new context
-        reset_chat()
-        # The first message will set the context
-        generate(context)  # This primes the conversation
+    def chat(self, message, context="", items=()):
+        """Send a message with the system prompt and the conversation so far
+        
+        `context` is sent along with the message; `items` are the retrieved
+        texts it contains, so they aren't sent again while the conversation
+        still holds them.
+        """
+        self.update_system_prompt()
+        notes = []
+        if self._context_changed:
+            notes.append(f"Updated user context:\n{self._user_context()}")
+        if context:
+            notes.append(context)
+        content = "\n\n".join(notes + [f"Current user message: {message}"]) if notes else message
+        
+        user_message = {"role": "user", "content": content}
+        messages = [{"role": "system", "content": self.system_prompt}] + self.history + [user_message]
+        
+        # Instrumentation: how much of this request repeats the previous one
+        # (and can come from the provider's prompt cache) and how much
+        # context was left out because the conversation already holds it
+        reused = len(self._last_request) if messages[:len(self._last_request)] == self._last_request else 0
+        stats = {
+            "sent_tokens": sum(estimate_tokens(m["content"]) for m in messages),
+            "cached_prefix_tokens": sum(estimate_tokens(m["content"]) for m in messages[:reused]),
+            "saved_tokens": self._skipped_tokens
+        }
+        self._skipped_tokens = 0
         
+        response = send_chat(self.api_key, self.model, messages)
+        # Only now has the update reached the model; if the request failed it goes with the next message
+        self._context_changed = False
+        
+        assistant_message = {"role": "assistant", "content": response}
+        self.history += [user_message, assistant_message]
+        # Facts are stored as the message that stated them, so the message counts too
+        carried = [[message, *items], [f"User: {message}\nBot: {response}"]]
+        self._carried += carried
+        self.session_items.update(carried[0] + carried[1])
+        self._last_request = messages + [assistant_message]
+        self.turn_stats.append(stats)
+        
+        # Same sliding window limma's chat() uses: drop the oldest exchanges
+        trimmed = False
+        while sum(len(m["content"]) for m in self.history) > self.max_history_chars and len(self.history) > 2:
+            for item in self._carried[0] + self._carried[1]:
+                self.session_items[item] -= 1
+                if self.session_items[item] <= 0:
+                    del self.session_items[item]
+            del self.history[:2]
+            del self._carried[:2]
+            trimmed = True
+        if trimmed:
+            # The prefix changes anyway, so fold any context updates back into the prompt
+            history, self.history = self.history, []
+            self._prompt_fields = None
+            self.update_system_prompt()
+            self.history = history
+        return response
+        
+    def context_savings(self):
+        """Totals of the per-turn token stats"""
+        return {key: sum(turn[key] for turn in self.turn_stats)
+                for key in ("sent_tokens", "cached_prefix_tokens", "saved_tokens")}
+                
     def process_message(self, user_input):
         """Process user message with context awareness"""
         
-        # Check for name if unknown
-        if not self.memory["name"] and "my name is" in user_input.lower():
-            import re
-            name_match = re.search(r"my name is (\w+)", user_input, re.IGNORECASE)
-            if name_match:
-                self.memory["name"] = name_match.group(1)
-                self.save_memory()
+        with self.store.lock:
+            # Check for name if unknown
+            if not self.memory["name"] and "my name is" in user_input.lower():
+                name_match = re.search(r"my name is (\w+)", user_input, re.IGNORECASE)
+                if name_match:
+                    self.memory["name"] = name_match.group(1)
+                    self.store.mark_dirty("name")
+                    
+            # Extract potential facts
+            new_facts = self.extract_facts(user_input)
+            if new_facts:
+                self.memory["facts"].extend(new_facts)
+                self.store.mark_dirty("facts")
+                for fact in new_facts:
+                    self._index_fact(fact)
                 
-        # Extract potential facts
-        new_facts = self.extract_facts(user_input)
-        if new_facts:
-            self.memory["facts"].extend(new_facts)
-            
-        # Update topics discussed
-        words = set(user_input.lower().split())
-        topics = [w for w in words if len(w) > 4]  # Simple topic extraction
-        self.memory["topics_discussed"].extend(topics)
+            # Update topics discussed
+            words = set(re.findall(r"\w+", user_input.lower()))
+            topics = [w for w in words if len(w) > 4]  # Simple topic extraction
+            self.topics.add(topics)
+            self.store.mark_dirty("topics")
         
         # Generate response with context
         try:
-            # Include recent conversation in context
-            recent_context = ""
-            if len(self.conversations) > 0:
-                recent = self.conversations[-3:]  # Last 3 exchanges
-                recent_context = "Recent conversation:\n"
-                for exchange in recent:
-                    recent_context += f"User: {exchange['user']}\nBot: {exchange['bot']}\n"
-                    
-            enhanced_input = f"{recent_context}\nCurrent user message: {user_input}"
-            
-            response = chat(enhanced_input)
+            # Include the facts and past exchanges relevant to this message
+            recent_context, items = self.retrieve_context(user_input)
+            response = self.chat(user_input, recent_context, items)
             
             # Save conversation
             self.save_conversation(user_input, response)
@@ -156,6 +665,7 @@ Guidelines:
             
     def get_summary(self):
         """Get summary of user context"""
+        savings = self.context_savings()
         summary = f"""
 📊 Context Summary for {self.memory.get('name', 'Anonymous User')}
 
@@ -163,10 +673,11 @@ Known Information:
 - Name: {self.memory.get('name', 'Not provided')}
 - Preferences: {self.memory.get('preferences', {})}
 - Facts stored: {len(self.memory.get('facts', []))}
-- Topics discussed: {len(set(self.memory.get('topics_discussed', [])))}
+- Topics discussed: {len(self.topics)}
 - Total conversations: {len(self.conversations)}
+- Tokens this session: {savings['sent_tokens']} sent, {savings['cached_prefix_tokens']} in a reused prefix, {savings['saved_tokens']} of repeated context skipped
 
-Recent topics: {', '.join(set(self.memory.get('topics_discussed', []))[-10:])}
+Recent topics: {', '.join(topic for topic, _ in self.topics.top(10))}
 """
         return summary
         
@@ -184,6 +695,7 @@ Recent topics: {', '.join(set(self.memory.get('topics_discussed', []))[-10:])}
                 user_input = input("\nYou: ").strip()
                 
                 if user_input.lower() == 'exit':
+                    self.close()
                     print("Bot: Goodbye! I'll remember our conversation next time.")
                     break
                     
@@ -194,15 +706,16 @@ Recent topics: {', '.join(set(self.memory.get('topics_discussed', []))[-10:])}
                 elif user_input.lower() == 'clear':
                     confirm = input("Are you sure? This will erase all memory. (yes/no): ")
                     if confirm.lower() == 'yes':
-                        self.memory = {
-                            "name": None,
-                            "preferences": {},
-                            "facts": [],
-                            "topics_discussed": [],
-                            "last_interaction": None
-                        }
+                        self.store.reset()
+                        self.topics = self._load_topics()
+                        self.index.clear()
+                        self.indexed_facts = set()
                         self.conversations = []
-                        self.save_memory()
+                        self.history = []
+                        self._carried = []
+                        self.session_items = Counter()
+                        self._last_request = []
+                        self._context_changed = False
                         print("Bot: Memory cleared. I've forgotten everything.")
                         self.update_system_prompt()
                     continue
@@ -212,11 +725,109 @@ Recent topics: {', '.join(set(self.memory.get('topics_discussed', []))[-10:])}
                     print(f"Bot: {response}")
                     
             except KeyboardInterrupt:
+                self.close()
                 print("\nBot: Goodbye!")
                 break
             except Exception as e:
                 print(f"Error: {e}")
 
+class ChatbotHost:
+    """Serves many users from one process
+    
+    Each user's chatbot is loaded on first use and kept in an LRU of at most
+    `capacity` users; the least recently used one is closed, writing its
+    memory and log to disk, when a new user needs the room. Files live in
+    `data_dir`, sharded by `user_dir()`. Every user has their own lock, so
+    requests for one user run one at a time while requests for different
+    users never wait for each other. The host-wide lock only guards the LRU
+    bookkeeping and is never held while loading, chatting or writing.
+    
+    A loaded user takes up to about 3 MB, mostly their retrieval index of
+    at most `max_indexed_turns` exchanges, so the default capacity stays
+    under about 400 MB.
+    """
+    
+    def __init__(self, data_dir="chatbot_users", capacity=128, flush_interval=1.0):
+        self.data_dir = data_dir
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._slots = OrderedDict()  # user_id -> slot, least recently used first
+        self._closing = {}  # user_id -> evicted slot still being written
+        self.stats = {"hits": 0, "loads": 0, "evictions": 0}
+        
+    @contextmanager
+    def user(self, user_id):
+        """Use a user's chatbot with their lock held, loading it if needed"""
+        user_dir(self.data_dir, user_id)  # reject bad IDs before taking a slot
+        with self._lock:
+            slot = self._slots.get(user_id)
+            if slot is None:
+                # Waits for an evicted copy to finish writing before reloading
+                slot = {"lock": threading.Lock(), "bot": None, "pins": 0,
+                        "previous": self._closing.get(user_id)}
+                self._slots[user_id] = slot
+            self._slots.move_to_end(user_id)
+            slot["pins"] += 1  # pinned slots are never evicted
+        try:
+            with slot["lock"]:
+                if slot["bot"] is None:
+                    if slot["previous"]:
+                        with slot["previous"]["lock"]:
+                            slot["previous"] = None
+                    slot["bot"] = ContextAwareChatbot(user_id, self.flush_interval, self.data_dir)
+                    loaded = True
+                else:
+                    loaded = False
+                with self._lock:
+                    self.stats["loads" if loaded else "hits"] += 1
+                yield slot["bot"]
+        finally:
+            with self._lock:
+                slot["pins"] -= 1
+            self._evict()
+            
+    def process_message(self, user_id, message):
+        """Answer one message for a user"""
+        with self.user(user_id) as bot:
+            return bot.process_message(message)
+            
+    def get_summary(self, user_id):
+        with self.user(user_id) as bot:
+            return bot.get_summary()
+            
+    def _evict(self, keep=None):
+        """Close least recently used users until at most `keep` are loaded"""
+        keep = self.capacity if keep is None else keep
+        victims = []
+        with self._lock:
+            for user_id, slot in list(self._slots.items()):
+                if len(self._slots) <= keep:
+                    break
+                # Unpinned slots have their lock free, so this never waits
+                if slot["pins"] or not slot["lock"].acquire(blocking=False):
+                    continue
+                del self._slots[user_id]
+                if slot["bot"] is None:
+                    slot["lock"].release()
+                    continue
+                self._closing[user_id] = slot
+                victims.append((user_id, slot))
+                
+        for user_id, slot in victims:
+            try:
+                slot["bot"].close()
+            finally:
+                slot["lock"].release()
+                with self._lock:
+                    if self._closing.get(user_id) is slot:
+                        del self._closing[user_id]
+                    self.stats["evictions"] += 1
+                    
+    def close(self):
+        """Write back and unload every user that isn't in use"""
+        self._evict(keep=0)
+        
 def main():
     # Create chatbot for specific user
     user_id = input("Enter your user ID (or press Enter for default): ").strip()